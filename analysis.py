@@ -0,0 +1,75 @@
+import numpy as np
+
+CONFIDENCE = 0.95
+
+
+def generate_confidence(lst: list, confidence: float = CONFIDENCE):
+    """
+    Used to generate the confidence intervals
+    :param lst: the data to be passed in
+    :param confidence: the confidence level of the interval
+    :return: the confidence interval
+    """
+    from scipy import stats  # only loaded once an interval is needed, so headless workers start fast
+
+    v = len(lst) - 1
+    mean, error = np.mean(lst), stats.sem(lst)
+    h = error * stats.t.ppf((1 + confidence) / 2, v)
+    return mean - h, mean + h
+
+
+class RunningStats:
+
+    def __init__(self):
+        """
+        Constructor for running statistics, which keep the mean and variance of a metric across replications
+        with Welford's method instead of keeping every value
+        """
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, values):
+        """
+        Adds a batch of replications, merging its mean and squared deviations into the running ones
+        :param values: one row per replication, one column per inspector or workstation
+        :return: None
+        """
+        values = np.asarray(values, dtype=float)
+        count = len(values)
+        if count == 0:
+            return
+        mean = values.mean(axis=0)
+        m2 = ((values - mean) ** 2).sum(axis=0)
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta * count / total
+        self.m2 = self.m2 + m2 + delta ** 2 * self.count * count / total
+        self.count = total
+
+    def variance(self):
+        """
+        Returns the sample variance
+        :return: the variance of each column
+        """
+        return self.m2 / (self.count - 1)
+
+    def half_width(self, confidence: float = CONFIDENCE):
+        """
+        Returns the half width of the confidence interval of the mean, as generate_confidence would give it
+        :param confidence: the confidence level of the interval
+        :return: the half width of each column
+        """
+        from scipy import stats
+
+        error = np.sqrt(self.variance() / self.count)
+        return error * stats.t.ppf((1 + confidence) / 2, self.count - 1)
+
+    def confidence(self, confidence: float = CONFIDENCE):
+        """
+        Returns the confidence interval of the mean
+        :param confidence: the confidence level of the interval
+        :return: the lower and upper bounds of each column
+        """
+        h = self.half_width(confidence)
+        return self.mean - h, self.mean + h
@@ -0,0 +1,224 @@
+import glob
+import os
+
+import numpy as np
+
+from tracing import FINISHED, SENT, STARTED, TOOK, load_trace
+
+TOLERANCE = 1e-9
+CHECKS = ("level_range", "conservation", "recorded_level", "workstation_time", "inspector_time", "horizon")
+
+
+def load_runs(directory: str) -> tuple:
+    """
+    Reads every trace written under a directory into one table
+    :param directory: the trace directory of a study, holding one run-<seed> directory per replication
+    :return: the records of all runs, the run index of each record, the end time of each run, and the description
+             of the runs, which must all be of the same facility, with their seeds and final buffer levels in run
+             order
+    """
+    paths = sorted(glob.glob(os.path.join(directory, "run-*")), key=lambda path: int(path.rsplit("-", 1)[1]))
+    if not paths:
+        raise ValueError("no traces in %s" % directory)
+    tables, runs, ends, meta = [], [], [], None
+    for index, path in enumerate(paths):
+        records, run_meta = load_trace(path)
+        if run_meta.get("levels") is None:
+            raise ValueError("%s has no final buffer levels, it was not closed by its replication" % path)
+        if meta is None:
+            meta = dict(run_meta, seeds=[], final_levels=[])
+        elif (run_meta["entities"], run_meta["components"]) != (meta["entities"], meta["components"]):
+            raise ValueError("%s is not a trace of the same facility" % path)
+        meta["seeds"].append(run_meta["seed"])
+        meta["final_levels"].append(run_meta["levels"])
+        tables.append(records)
+        runs.append(np.full(len(records), index, dtype=np.int32))
+        ends.append(run_meta["end"])
+    return np.concatenate(tables), np.concatenate(runs), np.array(ends, dtype=float), meta
+
+
+def group_starts(*keys) -> np.ndarray:
+    """
+    Marks where a run of equal keys starts in sorted data
+    :param keys: the sorted key columns
+    :return: True at the first row of every group
+    """
+    starts = np.zeros(len(keys[0]), dtype=bool)
+    starts[:1] = True
+    for key in keys:
+        starts[1:] |= key[1:] != key[:-1]
+    return starts
+
+
+def grouped_cumsum(values: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """
+    Cumulative sums restarting at every group
+    :param values: the values, in group order
+    :param starts: True at the first row of every group
+    :return: the sums
+    """
+    totals = np.cumsum(values)
+    before = totals - values  # the total before each row
+    return totals - np.maximum.accumulate(np.where(starts, before, 0))
+
+
+def buffer_index(meta: dict) -> tuple:
+    """
+    Finds the entity and component index of every buffer
+    :param meta: the description of the runs
+    :return: the workstation index and the component index of each buffer, in meta order
+    """
+    entities = {name: index for index, name in enumerate(meta["entities"])}
+    components = {name: index for index, name in enumerate(meta["components"])}
+    return (np.array([entities[b[0]] for b in meta["buffers"]], dtype=int),
+            np.array([components[b[1]] for b in meta["buffers"]], dtype=int))
+
+
+def per_run(records: np.ndarray, runs: np.ndarray, n_runs: int, kind: int, meta: dict, weights=None) -> np.ndarray:
+    """
+    Counts or sums the events of a kind per run, entity and component
+    :param records: the records of all runs
+    :param runs: the run index of each record
+    :param n_runs: the number of runs
+    :param kind: the index of the event kind in tracing.KINDS
+    :param meta: the description of the runs
+    :param weights: the value of each record to sum, e.g. the waits, None to count
+    :return: the totals, indexed by run, entity and component, events without a component under component 0
+    """
+    n_entities, n_components = len(meta["entities"]), len(meta["components"])
+    rows = records["kind"] == kind
+    component = np.maximum(records["component"][rows], 0)
+    index = (runs[rows] * n_entities + records["entity"][rows]) * n_components + component
+    totals = np.bincount(index, None if weights is None else weights[rows], n_runs * n_entities * n_components)
+    return totals.reshape(n_runs, n_entities, n_components)
+
+
+def buffer_changes(records: np.ndarray, runs: np.ndarray, meta: dict) -> dict:
+    """
+    Replays the buffer levels from the components sent and taken.
+    Events at the same time may be recorded in any order, so a level is only kept once all events at its time
+    have been applied.
+    :param records: the records of all runs
+    :param runs: the run index of each record
+    :param meta: the description of the runs
+    :return: the run, workstation, component, time, replayed level, recorded level and capacity of every change
+    """
+    moves = (records["kind"] == SENT) | (records["kind"] == TOOK)
+    rec, run = records[moves], runs[moves]
+    order = np.lexsort((np.arange(len(rec)), rec["time"], rec["component"], rec["destination"], run))
+    rec, run = rec[order], run[order]
+
+    delta = np.where(rec["kind"] == SENT, 1, -1)
+    level = grouped_cumsum(delta, group_starts(run, rec["destination"], rec["component"]))
+    last = np.ones(len(rec), dtype=bool)  # the last record of each buffer at each time
+    last[:-1] = group_starts(run, rec["destination"], rec["component"], rec["time"])[1:]
+
+    capacities = np.full((len(meta["entities"]), len(meta["components"])), -1)
+    workstations, components = buffer_index(meta)
+    capacities[workstations, components] = [b[2] for b in meta["buffers"]]
+
+    return {"run": run[last], "workstation": rec["destination"][last], "component": rec["component"][last],
+            "time": rec["time"][last], "level": level[last], "recorded": rec["level"][last],
+            "capacity": capacities[rec["destination"][last], rec["component"][last]]}
+
+
+def check(records: np.ndarray, runs: np.ndarray, ends: np.ndarray, meta: dict) -> dict:
+    """
+    Checks the invariants of the facility on the traces of many runs at once:
+    level_range, no buffer below 0 or above its capacity;
+    conservation, every component sent was either taken or is in the final level of its buffer recorded by the
+    facility, and every product started took one of each of its components;
+    recorded_level, the levels the entities saw agree with the replayed levels;
+    workstation_time, each product starts when the last one finished plus the wait, and finishes after it starts;
+    inspector_time, each component is sent no earlier than the last one was sent plus the time blocked;
+    horizon, no event after the end of its run
+    :param records: the records of all runs
+    :param runs: the run index of each record
+    :param ends: the end time of each run
+    :param meta: the description of the runs
+    :return: the number of violations of each check, and the runs that failed each check
+    """
+    failed = {}
+    changes = buffer_changes(records, runs, meta)
+    bad = (changes["level"] < 0) | (changes["level"] > changes["capacity"])
+    failed["level_range"] = changes["run"][bad]
+    failed["recorded_level"] = changes["run"][changes["level"] != changes["recorded"]]
+    final = np.ones(len(changes["run"]), dtype=bool)
+    final[:-1] = group_starts(changes["run"], changes["workstation"], changes["component"])[1:]
+    workstations, components = buffer_index(meta)
+    column = np.full((len(meta["entities"]), len(meta["components"])), -1)
+    column[workstations, components] = np.arange(len(meta["buffers"]))
+    replayed = np.zeros((len(ends), len(meta["buffers"])), dtype=int)  # sent minus taken, 0 for untouched buffers
+    replayed[changes["run"][final], column[changes["workstation"][final], changes["component"][final]]] = \
+        changes["level"][final]
+    used = per_run(records, runs, len(ends), TOOK, meta)[:, workstations, components]
+    products = per_run(records, runs, len(ends), STARTED, meta)[:, workstations, 0]
+    extra = used - products  # the components taken for a product still being collected at the end
+    failed["conservation"] = np.concatenate([np.nonzero(replayed != np.array(meta["final_levels"]))[0],
+                                             np.nonzero((extra < 0) | (extra > 1))[0]])
+
+    for name, kinds in (("workstation_time", (STARTED, FINISHED)), ("inspector_time", (SENT,))):
+        rows = np.isin(records["kind"], kinds)
+        rec, run = records[rows], runs[rows]
+        order = np.lexsort((np.arange(len(rec)), rec["time"], rec["entity"], run))
+        rec, run = rec[order], run[order]
+        starts = group_starts(run, rec["entity"])
+        previous = np.where(starts, 0.0, np.roll(rec["time"], 1))  # the last event of the entity, 0 for the first
+        ready = rec["time"] - rec["wait"]  # when the entity was ready to start or send
+        bad = (rec["wait"] < -TOLERANCE) | (ready < previous - TOLERANCE)
+        if name == "workstation_time":
+            previous_kind = np.where(starts, FINISHED, np.roll(rec["kind"], 1))
+            started = rec["kind"] == STARTED
+            bad |= rec["kind"] == previous_kind  # starts and finishes alternate, beginning with a start
+            bad |= started & (np.abs(ready - previous) > TOLERANCE)  # the wait began when the last product finished
+        failed[name] = run[bad]
+    failed["horizon"] = runs[records["time"] > ends[runs] + TOLERANCE]
+
+    return {"runs": len(ends), "violations": {name: int(len(failed[name])) for name in CHECKS},
+            "failed_runs": {name: sorted(set(failed[name].tolist())) for name in CHECKS}}
+
+
+def summarize(records: np.ndarray, runs: np.ndarray, ends: np.ndarray, meta: dict) -> dict:
+    """
+    Recomputes the statistics of the runs from their traces, without running the simulation again
+    :param records: the records of all runs
+    :param runs: the run index of each record
+    :param ends: the end time of each run
+    :param meta: the description of the runs
+    :return: per run metric arrays like replication.run_seeds, one column per inspector or workstation, and the time
+             weighted mean level of every buffer after the deletion point, one column per buffer in meta order
+    """
+    n_runs = len(ends)
+    workstations, components = buffer_index(meta)
+    n_workstations = len(set(workstations.tolist()))  # the workstations come first
+    counted = records["time"] >= meta["deletion_point"]
+    rec, run = records[counted], runs[counted]
+    blocked_time = per_run(rec, run, n_runs, SENT, meta, rec["wait"]).sum(axis=2)[:, n_workstations:]
+    wait_time = per_run(rec, run, n_runs, STARTED, meta, rec["wait"])[:, :n_workstations, 0]
+    products_made = per_run(rec, run, n_runs, FINISHED, meta)[:, :n_workstations, 0].astype(int)
+
+    changes = buffer_changes(records, runs, meta)
+    column = np.full((len(meta["entities"]), len(meta["components"])), -1)
+    column[workstations, components] = np.arange(len(meta["buffers"]))
+
+    # each level holds from its change until the next change of the buffer, or the end of the run
+    start = np.maximum(changes["time"], meta["deletion_point"])
+    following = np.roll(changes["time"], -1)
+    last = np.ones(len(start), dtype=bool)
+    last[:-1] = group_starts(changes["run"], changes["workstation"], changes["component"])[1:]
+    stop = np.where(last, ends[changes["run"]], following)
+    area = changes["level"] * np.clip(stop - start, 0, None)
+    index = changes["run"] * len(meta["buffers"]) + column[changes["workstation"], changes["component"]]
+    levels = np.bincount(index, area, n_runs * len(meta["buffers"])).reshape(n_runs, len(meta["buffers"]))
+
+    return {"blocked_time": blocked_time, "wait_time": wait_time, "products_made": products_made,
+            "buffer_levels": levels / (ends - meta["deletion_point"])[:, None], "seeds": meta["seeds"]}
+
+
+if __name__ == "__main__":
+    import sys
+
+    result = check(*load_runs(sys.argv[1]))
+    for name in CHECKS:
+        print("%-18s %d violations in %d of %d runs" % (name, result["violations"][name],
+                                                        len(result["failed_runs"][name]), result["runs"]))
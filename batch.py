@@ -0,0 +1,173 @@
+import numpy as np
+
+from inputs import MEANS
+
+ROUTE = np.array([0, 1, 3])  # buffers that take component 1, in workstation order
+WORKSTATION_BUFFERS = [[0], [1, 2], [3, 4]]  # buffers of each workstation, in the order components are taken
+FEEDER = [0, 0, 1, 0, 1]  # inspector filling each buffer
+OWNER = np.array([0, 1, 1, 2, 2])  # workstation emptying each buffer
+
+
+class BatchSimulator:
+
+    def __init__(self, means: dict = None, max_minutes: int = 3300, deletion_point: int = 300,
+                 alternate: bool = True, capacity: int = 2, seed=None):
+        """
+        Constructor for a simulator that advances many replications of the facility in lockstep.
+        Every replication is a column of the state arrays, and each step handles the next event of every
+        replication with masked updates, using exponential service times.
+        Buffers are numbered 0: workstation 1 component 1, 1: workstation 2 component 1, 2: workstation 2
+        component 2, 3: workstation 3 component 1 and 4: workstation 3 component 3.
+        :param means: mean of each service time stream, keyed like MEANS
+        :param max_minutes: the length of each replication
+        :param deletion_point: the deletion point of the model
+        :param alternate: if it is the alternate design
+        :param capacity: the capacity of every buffer
+        :param seed: the seed of the run, None for fresh entropy
+        """
+        self.means = dict(means or MEANS)
+        self.max_minutes = max_minutes
+        self.deletion_point = deletion_point
+        self.alternate = alternate
+        self.capacity = capacity
+        self.seed = seed
+
+    def run(self, n: int) -> dict:
+        """
+        Runs the replications
+        :param n: the number of replications
+        :return: per run metric arrays, one column per inspector or workstation
+        """
+        self.rng = np.random.default_rng(self.seed)
+        self.times = np.full((5, n), np.inf)  # next event of inspector 1, inspector 2 and workstations 1 to 3
+        self.now = np.zeros(n)
+        self.levels = np.zeros((5, n), dtype=int)
+        self.target = np.zeros(n, dtype=int)  # buffer of the component inspector 2 is inspecting
+        self.blocked_on = np.full((2, n), -1)
+        self.block_start = np.zeros((2, n))
+        self.collected = np.zeros((3, n), dtype=int)
+        self.starved = np.full((3, n), -1)  # buffer each workstation is waiting on
+        self.before = np.zeros((3, n))
+        self.blocked_time = np.zeros((2, n))
+        self.wait_time = np.zeros((3, n))
+        self.products_made = np.zeros((3, n), dtype=int)
+
+        everyone = np.arange(n)
+        for i in range(2):
+            self.start_inspection(i, everyone)
+        for j in range(3):
+            self.collect(j, everyone)
+
+        while True:
+            event = self.times.argmin(axis=0)
+            self.now = self.times[event, everyone]
+            live = self.now < self.max_minutes
+            if not live.any():
+                break
+            for k in range(5):
+                rows = np.nonzero(live & (event == k))[0]
+                if rows.size and k < 2:
+                    self.inspection_done(k, rows)
+                elif rows.size:
+                    self.product_done(k - 2, rows)
+
+        return {"blocked_time": self.blocked_time.T.copy(), "wait_time": self.wait_time.T.copy(),
+                "products_made": self.products_made.T.copy()}
+
+    def start_inspection(self, i: int, rows: np.ndarray):
+        """
+        Starts inspecting a randomly chosen component
+        :param i: the inspector
+        :param rows: the replications
+        :return: None
+        """
+        if i == 0:
+            mean = self.means["insp1_time"]
+        else:
+            self.target[rows] = np.where(self.rng.random(rows.size) < 0.5, 2, 4)
+            mean = np.where(self.target[rows] == 2, self.means["insp22_time"], self.means["insp23_time"])
+        self.times[i, rows] = self.now[rows] + self.rng.exponential(mean, rows.size)
+
+    def inspection_done(self, i: int, rows: np.ndarray):
+        """
+        Sends the inspected components to the workstations with the fewest components, or blocks
+        :param i: the inspector
+        :param rows: the replications
+        :return: None
+        """
+        self.block_start[i, rows] = self.now[rows]
+        if i == 0:
+            levels = self.levels[ROUTE][:, rows]
+            if self.alternate:  # last workstation with the fewest components
+                buffers = ROUTE[len(ROUTE) - 1 - levels[::-1].argmin(axis=0)]
+            else:  # first workstation with the fewest components
+                buffers = ROUTE[levels.argmin(axis=0)]
+        else:
+            buffers = self.target[rows]
+
+        free = self.levels[buffers, rows] < self.capacity
+        self.times[i, rows[~free]] = np.inf
+        self.blocked_on[i, rows[~free]] = buffers[~free]
+
+        rows, buffers = rows[free], buffers[free]
+        self.levels[buffers, rows] += 1
+        for j in range(3):  # workstations waiting on the buffers take the components
+            waiting = self.starved[j, rows] == buffers
+            if waiting.any():
+                self.collect(j, rows[waiting])
+        self.finish_put(i, rows)
+
+    def finish_put(self, i: int, rows: np.ndarray):
+        """
+        Called once the component of an inspector is in a buffer
+        :param i: the inspector
+        :param rows: the replications
+        :return: None
+        """
+        now = self.now[rows]
+        self.blocked_time[i, rows] += np.where(now >= self.deletion_point, now - self.block_start[i, rows], 0)
+        self.start_inspection(i, rows)
+
+    def collect(self, j: int, rows: np.ndarray):
+        """
+        Takes components from the buffers of a workstation in order until one is empty or the product can be built
+        :param j: the workstation
+        :param rows: the replications
+        :return: None
+        """
+        buffers = WORKSTATION_BUFFERS[j]
+        for position, b in enumerate(buffers):
+            needing = rows[self.collected[j, rows] == position]
+            available = self.levels[b, needing] > 0
+            self.starved[j, needing[~available]] = b
+
+            taking = needing[available]
+            self.levels[b, taking] -= 1
+            self.collected[j, taking] += 1
+
+            i = FEEDER[b]  # the freed space lets a blocked inspector finish its put
+            released = taking[self.blocked_on[i, taking] == b]
+            if released.size:
+                self.levels[b, released] += 1
+                self.blocked_on[i, released] = -1
+                self.finish_put(i, released)
+
+        ready = rows[self.collected[j, rows] == len(buffers)]
+        now = self.now[ready]
+        self.starved[j, ready] = -1
+        self.wait_time[j, ready] += np.where(now >= self.deletion_point, now - self.before[j, ready], 0)
+        self.times[2 + j, ready] = now + self.rng.exponential(self.means["ws%d_time" % (j + 1)], ready.size)
+
+    def product_done(self, j: int, rows: np.ndarray):
+        """
+        Finishes building a product and starts waiting for the next one
+        :param j: the workstation
+        :param rows: the replications
+        :return: None
+        """
+        now = self.now[rows]
+        self.products_made[j, rows] += now >= self.deletion_point
+        self.times[2 + j, rows] = np.inf
+        self.collected[j, rows] = 0
+        self.before[j, rows] = now
+        self.collect(j, rows)
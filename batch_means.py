@@ -0,0 +1,76 @@
+import numpy as np
+from scipy import stats
+
+from analysis import CONFIDENCE, generate_confidence
+from replication import close_trace, resolve_deletion_point, setup
+
+METRICS = ("blocked_time", "wait_time", "products_made")
+
+
+def snapshot(inspectors: list, workstations: list) -> np.ndarray:
+    """
+    Reads the accumulated statistics of the facility
+    :param inspectors: the inspectors
+    :param workstations: the workstations
+    :return: the blocked times, wait times and products made, in that order
+    """
+    return np.array([i.blocked_time for i in inspectors] + [w.wait_time for w in workstations] +
+                    [w.products_made for w in workstations], dtype=float)
+
+
+def lag1_autocorrelation(batches: np.ndarray) -> np.ndarray:
+    """
+    The lag 1 autocorrelation of each column of batch means, 0 for a column that never changes
+    :param batches: one row per batch
+    :return: the autocorrelation of each column
+    """
+    centered = batches - batches.mean(axis=0)
+    variance = (centered ** 2).sum(axis=0)
+    covariance = (centered[1:] * centered[:-1]).sum(axis=0)
+    return np.divide(covariance, variance, out=np.zeros(len(variance)), where=variance > 0)
+
+
+def run_batch_means(config: dict = None, batches: int = 20, batch_minutes: int = 100, max_minutes: int = 1000000,
+                    seed=None, confidence: float = CONFIDENCE) -> dict:
+    """
+    Runs one long replication past a single deletion point and splits the output after it into batches.
+    The batch size is doubled, running the simulation further, until the lag 1 autocorrelation of every
+    metric is not significant.
+    :param config: the facility config, whose deletion point is used, "auto" to pick it from pilot runs
+    :param batches: the number of batches
+    :param batch_minutes: the starting batch size in minutes
+    :param max_minutes: the longest the simulation may run, even if the batches are not independent
+    :param seed: the seed of the replication
+    :param confidence: the confidence level of the intervals and the autocorrelation test
+    :return: the batch size, if the batches are independent, and the per minute mean and confidence interval
+             of every metric, one entry per inspector or workstation
+    """
+    config = resolve_deletion_point(config, seed)
+    env, inspectors, workstations = setup(config, seed)
+    if config["deletion_point"] > 0:
+        env.run(until=config["deletion_point"])
+    totals = [snapshot(inspectors, workstations)]  # statistics at the end of every batch_minutes interval
+
+    bound = stats.norm.ppf((1 + confidence) / 2) / np.sqrt(batches)
+    size, means, independent = 1, None, False
+    while config["deletion_point"] + batches * size * batch_minutes <= max_minutes:
+        while len(totals) <= batches * size:
+            env.run(until=config["deletion_point"] + len(totals) * batch_minutes)
+            totals.append(snapshot(inspectors, workstations))
+
+        used = size
+        means = np.diff(np.array(totals[:batches * size + 1:size]), axis=0) / (size * batch_minutes)
+        independent = bool((np.abs(lag1_autocorrelation(means)) < bound).all())
+        if independent:
+            break
+        size *= 2
+    close_trace(env, inspectors, workstations)
+    if means is None:
+        raise ValueError("max_minutes is too short for %d batches of %d minutes" % (batches, batch_minutes))
+
+    split = np.cumsum([len(inspectors), len(workstations)])
+    result = {"batch_minutes": used * batch_minutes, "independent": independent, "mean": {}, "confidence": {}}
+    for metric, columns in zip(METRICS, np.split(means, split, axis=1)):
+        result["mean"][metric] = columns.mean(axis=0)
+        result["confidence"][metric] = [generate_confidence(column, confidence) for column in columns.T]
+    return result
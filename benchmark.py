@@ -0,0 +1,175 @@
+import json
+import os
+import platform
+import time
+import timeit
+import tracemalloc
+
+import numpy as np
+import simpy
+
+from replication import make_config, replication_seeds, run_replications, setup, simulate
+
+HORIZONS = (1000, 3300, 10000)
+WIDTHS = (3, 30, 100)  # workstations on the generated lines
+WORKERS = (1, 2, 4)
+REPEATS = 3
+CALLS = 100000
+THRESHOLD = 0.1
+LOWER_IS_BETTER = ("_seconds", "_ns", "_bytes")
+HIGHER_IS_BETTER = ("_per_second",)
+
+
+def line_topology(workstations: int) -> dict:
+    """
+    Builds a line of identical workstations fed by one inspector, loaded to about 90% so the routing is busy
+    :param workstations: the number of workstations
+    :return: the topology
+    """
+    return {"components": ["Component 1"],
+            "products": [{"name": "Product 1", "required_components": ["Component 1"]}],
+            "streams": {"insp_time": {"mean": 10.0 / (0.9 * workstations)}, "ws_time": {"mean": 10.0}},
+            "workstations": [{"name": "Workstation %d" % (n + 1), "product": "Product 1", "service": "ws_time"}
+                             for n in range(workstations)],
+            "inspectors": [{"name": "Inspector 1", "components": {"Component 1": "insp_time"}}]}
+
+
+def time_replication(config: dict, seed: int, repeats: int = REPEATS) -> dict:
+    """
+    Times the event loop of one replication, leaving out building the facility
+    :param config: the facility config
+    :param seed: the seed of the replication
+    :param repeats: the number of timed runs, the fastest is kept
+    :return: the wall time, the number of events and the events per second
+    """
+    config = make_config(config)
+    best, events = float("inf"), 0
+    for _ in range(repeats):
+        env, _, _ = setup(config, seed)
+        start = time.perf_counter()
+        env.run(until=config["max_minutes"])
+        best = min(best, time.perf_counter() - start)
+        # events scheduled: SimPy numbers every event it schedules, the heap engine counts them
+        events = next(env._eid) if isinstance(env, simpy.Environment) else env.count
+    return {"replication_seconds": best, "events": events, "events_per_second": events / best}
+
+
+def time_calls(config: dict, seed: int, calls: int = CALLS) -> dict:
+    """
+    Times the per event calls of the SimPy model on a facility that has run to its deletion point
+    :param config: the facility config
+    :param seed: the seed of the replication
+    :param calls: the number of calls timed
+    :return: the cost of Inspector.send_component and of a service time draw in nanoseconds per call
+    """
+    config = make_config(dict(config, engine="simpy"))
+    env, inspectors, workstations = setup(config, seed)
+    env.run(until=config["deletion_point"])
+    inspector = inspectors[0]
+    component = inspector.components[0]
+    sampler = workstations[0].processing_times
+    return {"send_component_ns": timeit.timeit(lambda: inspector.send_component(component), number=calls) / calls * 1e9,
+            "draw_ns": timeit.timeit(sampler.draw, number=calls) / calls * 1e9}
+
+
+def peak_memory(config: dict, seed: int) -> dict:
+    """
+    Measures the memory a replication allocates
+    :param config: the facility config
+    :param seed: the seed of the replication
+    :return: the peak of the Python allocations in bytes
+    """
+    tracemalloc.start()
+    try:
+        simulate(config, seed)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"peak_bytes": peak}
+
+
+def run_benchmarks(config: dict = None, engines=("simpy", "heap"), horizons=HORIZONS, widths=WIDTHS,
+                   workers=WORKERS, repeats: int = REPEATS, seed: int = 0) -> dict:
+    """
+    Measures the speed of the simulation and how it scales
+    :param config: the facility config
+    :param engines: the engines measured
+    :param horizons: the run lengths in minutes measured
+    :param widths: the numbers of workstations measured, on generated lines
+    :param workers: the numbers of worker processes measured
+    :param repeats: the number of timed runs of each measurement, the fastest is kept
+    :param seed: the seed of the replications
+    :return: the environment and the results, keyed by what was measured with the unit as the suffix
+    """
+    config = make_config(config)
+    run_seed = replication_seeds(seed, 1)[0]
+    results = {}
+    for name in engines:
+        engine_config = dict(config, engine=name)
+        for key, value in time_replication(engine_config, run_seed, repeats).items():
+            results["%s/%s" % (name, key)] = value
+        results["%s/peak_bytes" % name] = peak_memory(engine_config, run_seed)["peak_bytes"]
+        for horizon in horizons:
+            timing = time_replication(dict(engine_config, max_minutes=horizon), run_seed, repeats)
+            results["%s/horizon=%d/replication_seconds" % (name, horizon)] = timing["replication_seconds"]
+        for width in widths:
+            line = dict(engine_config, topology=line_topology(width), means={}, sampling="exponential")
+            timing = time_replication(line, run_seed, repeats)
+            results["%s/workstations=%d/events_per_second" % (name, width)] = timing["events_per_second"]
+    results.update(time_calls(config, run_seed))
+
+    runs = 4 * max(workers)
+    for count in workers:
+        start = time.perf_counter()
+        run_replications(config, runs, seed, workers=count)
+        results["workers=%d/%d_replications_seconds" % (count, runs)] = time.perf_counter() - start
+
+    return {"python": platform.python_version(), "numpy": np.__version__, "simpy": simpy.__version__,
+            "cpus": os.cpu_count(), "results": results}
+
+
+def compare(results: dict, baseline: dict, threshold: float = THRESHOLD) -> list:
+    """
+    Flags the measurements that got worse than the baseline by more than a threshold
+    :param results: the output of run_benchmarks
+    :param baseline: an earlier output of run_benchmarks
+    :param threshold: the relative change allowed, 0.1 for 10%
+    :return: the regressions, each with its measurement, baseline value, new value and relative change
+    """
+    regressions = []
+    for key, old in baseline["results"].items():
+        new = results["results"].get(key)
+        if new is None or not old:
+            continue
+        change = (new - old) / old
+        if key.endswith(LOWER_IS_BETTER) and change > threshold or \
+                key.endswith(HIGHER_IS_BETTER) and change < -threshold:
+            regressions.append({"key": key, "baseline": old, "value": new, "change": change})
+    return regressions
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the simulation")
+    parser.add_argument("--output", default="benchmark.json", help="where the results are written")
+    parser.add_argument("--baseline", help="earlier results to check for regressions")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="relative slowdown that is flagged")
+    parser.add_argument("--quick", action="store_true", help="one repeat and the smallest scaling points")
+    args = parser.parse_args()
+
+    if args.quick:
+        output = run_benchmarks(horizons=HORIZONS[:2], widths=WIDTHS[:2], workers=WORKERS[:2], repeats=1)
+    else:
+        output = run_benchmarks()
+    with open(args.output, "w") as f:
+        json.dump(output, f, indent=1)
+    for key, value in output["results"].items():
+        print("%-50s %.6g" % (key, value))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(output, json.load(f), args.threshold)
+        for r in regressions:
+            print("REGRESSION %-39s %.6g -> %.6g (%+.1f%%)" % (r["key"], r["baseline"], r["value"], 100 * r["change"]))
+        raise SystemExit(1 if regressions else 0)
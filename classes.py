@@ -2,7 +2,10 @@ import random
 
 import simpy
 
-SIZE = 3300
+import metrics
+import routing
+import tracing
+from samplers import as_sampler
 
 
 class Component:
@@ -30,31 +33,44 @@ class Product:
 class Workstation:
 
     def __init__(self, env: simpy.Environment, name: str, product: Product, processing_times: list, debug: bool,
-                 deletion_point: int):
+                 deletion_point: int, metrics_on: dict = None, capacity=2, tracer: tracing.Tracer = None):
         """
         Constructor for workstation
         :param env: the environment the workstation will be
         :param name:  of the workstation
         :param product:  the product that the workstation is building
-        :param processing_times: the processing times generated in the .dat file
+        :param processing_times: the processing times generated in the .dat file, or a sampler drawing them
         :param debug: if debug mode should be on
         :param deletion_point: the deletion point of the model
+        :param metrics_on: the metrics kept with their options, metrics.DEFAULT_METRICS if None
+        :param capacity: the capacity of every buffer, or a dict of the capacity of each component's buffer
+        :param tracer: the tracer recording the events of the run, None to not trace
         """
         self.name = name
         self.product = product
         self.buffers = {}
         for i in product.required_components:
-            self.buffers[i] = simpy.Container(env, 2)
+            self.buffers[i] = routing.Container(env, capacity[i] if isinstance(capacity, dict) else capacity)
         self.env = env
-        self.processing_times = processing_times
+        self.processing_times = as_sampler(processing_times)
         self.products_made = 0
         env.process(self.workstation_process())
         self.wait_time = 0
         self.debug = debug
         self.deletion_point = deletion_point
-        self.products_time = [0] * SIZE
-        self.components_held = {}
-        self.components_used = {}
+
+        metrics_on = metrics.resolve(metrics_on, debug)
+        names = [i.name for i in self.buffers]
+        self.products_time = metrics.histogram(metrics_on, "products_time")
+        self.components_held = metrics.counters(metrics_on, names)
+        self.components_used = metrics.counters(metrics_on, names)
+        self.buffer_levels = {i: metrics.time_weighted(metrics_on, "buffer_levels", deletion_point)
+                              for i in self.buffers}
+        self.busy = metrics.time_weighted(metrics_on, "utilization", deletion_point)
+        self.tracer = tracer
+        if tracer is not None:
+            self.trace_id = tracer.entities[name]
+            self.trace_components = [tracer.components[i.name] for i in self.buffers]
 
     def workstation_process(self):
         """
@@ -63,25 +79,28 @@ class Workstation:
         """
         while True:
             before_time = self.env.now
-            for i in self.buffers.keys():  # wait until all components are available
+            for position, i in enumerate(self.buffers.keys()):  # wait until all components are available
                 yield self.buffers[i].get(1)  # try to get one component from each of the buffers
-                if self.debug and i.name in self.components_used:
-                    self.components_used[i.name] += 1
-                    self.components_held[i.name] += 1
-                elif self.debug:
-                    self.components_used[i.name] = 1
-                    self.components_held[i.name] = 1
+                self.components_used.add(position)
+                self.components_held.add(position)
+                self.buffer_levels[i].update(self.env.now, self.buffers[i].level)
+                if self.tracer is not None:
+                    self.tracer.record(self.env.now, self.trace_id, tracing.TOOK, self.trace_components[position],
+                                       self.trace_id, self.buffers[i].level)
 
             if self.env.now >= self.deletion_point:
                 self.wait_time += (self.env.now - before_time)
+            self.busy.update(self.env.now, 1)
+            if self.tracer is not None:
+                self.tracer.record(self.env.now, self.trace_id, tracing.STARTED, wait=self.env.now - before_time)
 
             if self.debug:
                 print(self.name, " waited for: ", self.env.now - before_time, " minutes")
                 print(self.name, " creating ", self.product.name, " at ", round(self.env.now, 3),
                       " minutes")
 
-            # generate random processing time from input list
-            process_time = self.processing_times.pop(random.randint(0, len(self.processing_times) - 1))
+            # draw random processing time from the sampler
+            process_time = self.processing_times.draw()
             yield self.env.timeout(process_time)
 
             if self.debug:
@@ -90,27 +109,35 @@ class Workstation:
 
             if self.env.now >= self.deletion_point:
                 self.products_made += 1
-                if self.debug:
-                    for i in self.buffers.keys():
-                        self.components_held[i.name] -= 1
+                for position in range(len(self.buffers)):
+                    self.components_held.add(position, -1)
+            if self.tracer is not None:
+                self.tracer.record(self.env.now, self.trace_id, tracing.FINISHED)
 
-            self.products_time[int(self.env.now)] += 1
+            self.busy.update(self.env.now, 0)
+            self.products_time.add(self.env.now)
 
 
 class Inspector:
 
     def __init__(self, env: simpy.Environment, name: str, components: list, processing_times: list,
-                 workstations: list, debug: bool, deletion_point: int, alternate: bool):
+                 workstations: list, debug: bool, deletion_point: int, alternate: bool, rng=None,
+                 metrics_on: dict = None, policy: str = None, tracer: tracing.Tracer = None):
         """
         Constructor for an inspector
         :param env: the environment the inspector will be
         :param name: of the inspector
         :param components: the components the inspector will build
-        :param processing_times: the processing times generated in the .dat file
+        :param processing_times: the processing times generated in the .dat file, or a sampler drawing them,
+                                 for each component
         :param workstations: the workstations that the inspector can send components to
         :param debug: if debug mode should be on
         :param deletion_point: the deletion point of the model
         :param alternate: if it is the alternate design
+        :param rng: the random.Random choosing the components, the random module if None
+        :param metrics_on: the metrics kept with their options, metrics.DEFAULT_METRICS if None
+        :param policy: the routing policy, one of routing.ROUTERS, first or last depending on alternate if None
+        :param tracer: the tracer recording the events of the run, None to not trace
         """
         self.name = name
         self.components = components
@@ -119,7 +146,7 @@ class Inspector:
 
         count = 0
         for i in components:
-            self.processing_times[i] = processing_times[count]
+            self.processing_times[i] = as_sampler(processing_times[count])
             count += 1
 
         self.workstations = workstations
@@ -127,39 +154,39 @@ class Inspector:
         self.blocked_time = 0
         self.debug = debug
         self.deletion_point = deletion_point
-        if debug:
-            self.components_inspected = {}
+        metrics_on = metrics.resolve(metrics_on, debug)
+        self.components_inspected = metrics.counters(metrics_on, [i.name for i in components])
+        self.blocking = metrics.time_weighted(metrics_on, "utilization", deletion_point)
         self.alternate = alternate
+        self.rng = rng or random
+        self.policy = policy or ("last" if alternate else "first")
+        self.routes = routing.route(workstations, components, self.policy)
+        # the counter of each component and the buffer level metric of each of its candidates, found once
+        self.positions = {i: n for n, i in enumerate(components)}
+        self.levels = {i: [w.buffer_levels[i] for w in self.routes[i][0]] for i in components}
+        self.tracer = tracer
+        if tracer is not None:
+            self.trace_id = tracer.entities[name]
+            self.trace_components = {i: tracer.components[i.name] for i in components}
 
     def send_component(self, component: Component) -> Workstation:
         """
-        Used to find the workstation with the minimal buffer
+        Used to find the workstation to send a component to, by default the one with the minimal buffer
 
         :param component: sends component to an available workstation
         :return: the workstation where it is sent
         """
-        min_buffer = 2
-
-        for workstation in self.workstations:  # find buffer with minimal components
-            if component in workstation.buffers.keys() and workstation.buffers[component].level < min_buffer:
-                min_buffer = workstation.buffers[component].level
-
-        if not self.alternate:
-            for workstation in self.workstations:  # find first workstation with minimal buffer
-                if component in workstation.buffers.keys() and workstation.buffers[component].level == min_buffer:
-                    return workstation
-        else:
-            for workstation in self.workstations:  # find last workstation with minimal buffer
-                if component in workstation.buffers.keys() and workstation.buffers[component].level == min_buffer:
-                    temp_w = workstation
-            return temp_w
+        candidates, router = self.routes[component]
+        return candidates[router.choose()]
 
     def choose_random_component(self) -> Component:
         """
         Returns a randomly chosen component for the inspector
         :return: a component
         """
-        return self.components[random.randint(0, len(self.components) - 1)]
+        if len(self.components) == 1:
+            return self.components[0]
+        return self.components[int(self.rng.random() * len(self.components))]
 
     def inspector_process(self):
         """
@@ -168,22 +195,32 @@ class Inspector:
         """
         while True:
             component = self.choose_random_component()
-            delay = self.processing_times[component].pop(random.randint(0, len(self.processing_times[component]) - 1))
+            delay = self.processing_times[component].draw()
             yield self.env.timeout(delay)  # allow delay for processing times
 
             before_time = self.env.now
 
             # try to put component inside buffer or wait until buffer is free
-            destination = self.send_component(component)
-            yield destination.buffers[component].put(1)
+            candidates, router = self.routes[component]  # same choice as send_component
+            choice = router.choose()
+            destination = candidates[choice]
+            buffer = destination.buffers[component]
+            if self.tracer is not None and buffer.level == buffer.capacity:
+                self.tracer.record(self.env.now, self.trace_id, tracing.BLOCKED, self.trace_components[component],
+                                   self.tracer.entities[destination.name], buffer.level)
+            yield buffer.put(1)
 
             if self.debug:
                 print(self.name, " sent ", component.name, " to ", destination.name, " at ", round(self.env.now, 3),
                       " minutes")
-                if component.name in self.components_inspected:
-                    self.components_inspected[component.name] += 1
-                else:
-                    self.components_inspected[component.name] = 1
+            self.components_inspected.add(self.positions[component])
+            self.levels[component][choice].update(self.env.now, buffer.level)
+            if self.tracer is not None:
+                self.tracer.record(self.env.now, self.trace_id, tracing.SENT, self.trace_components[component],
+                                   self.tracer.entities[destination.name], buffer.level, self.env.now - before_time)
+            if self.env.now > before_time:
+                self.blocking.update(before_time, 1)
+                self.blocking.update(self.env.now, 0)
 
             if self.env.now >= self.deletion_point:
                 self.blocked_time += (self.env.now - before_time)
@@ -0,0 +1,61 @@
+import numpy as np
+
+from analysis import CONFIDENCE, generate_confidence
+from replication import replication_seeds, resolve_deletion_point, run_seeds
+
+METRICS = ("blocked_time", "wait_time", "products_made")
+
+
+def paired_runs(config: dict, seeds: list, antithetic: bool, workers: int) -> dict:
+    """
+    Runs the same seeds under both policies, averaging each seed with its antithetic run if asked
+    :param config: the facility config
+    :param seeds: the seeds of the replications
+    :param antithetic: if antithetic runs should be made
+    :param workers: the number of worker processes, 1 to run in this process
+    :return: the metric arrays of the standard and the alternate policy
+    """
+    results = {}
+    for alternate in (False, True):
+        runs = run_seeds(dict(config, alternate=alternate, antithetic=False), seeds, workers)
+        results[alternate] = {metric: runs[metric].astype(float) for metric in METRICS}
+        if antithetic:
+            mirrored = run_seeds(dict(config, alternate=alternate, antithetic=True), seeds, workers)
+            for metric in METRICS:
+                results[alternate][metric] = (results[alternate][metric] + mirrored[metric]) / 2
+    return results
+
+
+def compare_policies(config: dict = None, runs: int = 50, seed=None, antithetic: bool = False,
+                     workers: int = None, confidence: float = CONFIDENCE) -> dict:
+    """
+    Compares the standard and the alternate policy with common random numbers.
+    Every seed is run under both policies, so each inspector's component choices and each service time stream
+    are the same for both, and the confidence intervals are taken on the paired differences.
+    :param config: the facility config
+    :param runs: the number of seeds, each run under both policies
+    :param seed: the seed of the study, None for fresh entropy
+    :param antithetic: if each seed should also be run with antithetic variates and averaged with it
+    :param workers: the number of worker processes, 1 to run in this process
+    :param confidence: the confidence level of the intervals
+    :return: the mean of each policy, and the mean, confidence interval and variance reduction over independent
+             sampling of the alternate minus the standard policy, one entry per inspector or workstation
+    """
+    config = resolve_deletion_point(config, seed, workers)  # both policies get the same deletion point
+    results = paired_runs(config, replication_seeds(seed, runs), antithetic, workers)
+    standard, alternate = results[False], results[True]
+
+    comparison = {"runs": runs, "antithetic": antithetic, "standard": {}, "alternate": {}, "difference": {},
+                  "confidence": {}, "variance_reduction": {}}
+    for metric in METRICS:
+        difference = alternate[metric] - standard[metric]
+        comparison["standard"][metric] = standard[metric].mean(axis=0)
+        comparison["alternate"][metric] = alternate[metric].mean(axis=0)
+        comparison["difference"][metric] = difference.mean(axis=0)
+        comparison["confidence"][metric] = [generate_confidence(column, confidence) for column in difference.T]
+
+        independent = standard[metric].var(axis=0, ddof=1) + alternate[metric].var(axis=0, ddof=1)
+        paired = difference.var(axis=0, ddof=1)
+        comparison["variance_reduction"][metric] = np.divide(independent, paired, out=np.full(len(paired), np.inf),
+                                                             where=paired > 0)
+    return comparison
@@ -0,0 +1,318 @@
+import heapq
+import random
+from collections import deque
+
+import classes
+import metrics
+import routing
+import tracing
+from classes import Product
+from samplers import as_sampler
+
+
+class EventEngine:
+
+    def __init__(self):
+        """
+        Constructor for a heapq based event engine, used in place of a simpy.Environment
+        """
+        self.now = 0.0
+        self.queue = []
+        self.count = 0
+
+    def schedule(self, delay: float, callback):
+        """
+        Schedules a callback to be run after a delay
+        :param delay: the delay in minutes
+        :param callback: the function to run
+        :return: None
+        """
+        heapq.heappush(self.queue, (self.now + delay, self.count, callback))
+        self.count += 1
+
+    def run(self, until: float):
+        """
+        Runs the events scheduled before a time, in time order
+        :param until: the time to stop at
+        :return: None
+        """
+        queue = self.queue
+        while queue and queue[0][0] < until:
+            self.now, _, callback = heapq.heappop(queue)
+            callback()
+        self.now = until
+
+
+class Buffer:
+    __slots__ = ("level", "capacity", "blocked", "watchers")
+
+    def __init__(self, capacity: int):
+        """
+        Constructor for a buffer, an integer counter in place of a simpy.Container
+        :param capacity: the most components the buffer can hold
+        """
+        self.level = 0
+        self.capacity = capacity
+        self.blocked = deque()  # inspectors waiting to put a component in the buffer, in the order they blocked
+        self.watchers = []  # the routers and the position of the buffer in each of them
+
+    def change(self, n: int):
+        """
+        Changes the level of the buffer and tells the routers watching it
+        :param n: the number of components put, negative for components taken
+        :return: None
+        """
+        self.level += n
+        for router, position in self.watchers:
+            router.moved(position, self.level)
+
+
+class Workstation:
+
+    def __init__(self, env: EventEngine, name: str, product: Product, processing_times: list, debug: bool,
+                 deletion_point: int, metrics_on: dict = None, capacity=2, tracer: tracing.Tracer = None):
+        """
+        Constructor for workstation
+        :param env: the engine the workstation will be in
+        :param name:  of the workstation
+        :param product:  the product that the workstation is building
+        :param processing_times: the processing times generated in the .dat file, or a sampler drawing them
+        :param debug: if the debug counters should be kept
+        :param deletion_point: the deletion point of the model
+        :param metrics_on: the metrics kept with their options, metrics.DEFAULT_METRICS if None
+        :param capacity: the capacity of every buffer, or a dict of the capacity of each component's buffer
+        :param tracer: the tracer recording the events of the run, None to not trace
+        """
+        self.name = name
+        self.product = product
+        self.buffers = {}
+        for i in product.required_components:
+            self.buffers[i] = Buffer(capacity[i] if isinstance(capacity, dict) else capacity)
+        self.components = list(self.buffers)
+        self.env = env
+        self.processing_times = as_sampler(processing_times)
+        self.products_made = 0
+        self.wait_time = 0
+        self.debug = debug
+        self.deletion_point = deletion_point
+
+        metrics_on = metrics.resolve(metrics_on, debug)
+        names = [i.name for i in self.components]
+        self.products_time = metrics.histogram(metrics_on, "products_time")
+        self.components_held = metrics.counters(metrics_on, names)
+        self.components_used = metrics.counters(metrics_on, names)
+        self.buffer_levels = {i: metrics.time_weighted(metrics_on, "buffer_levels", deletion_point)
+                              for i in self.components}
+        self.busy = metrics.time_weighted(metrics_on, "utilization", deletion_point)
+        self.starved = None  # component the workstation is waiting for
+        self.collected = 0
+        self.before_time = 0
+        self.tracer = tracer
+        if tracer is not None:
+            self.trace_id = tracer.entities[name]
+            self.trace_components = [tracer.components[i.name] for i in self.components]
+        env.schedule(0, self.start)
+
+    def start(self):
+        """
+        Starts waiting for the components of the next product
+        :return: None
+        """
+        self.before_time = self.env.now
+        self.collected = 0
+        self.collect()
+
+    def collect(self):
+        """
+        Takes components from the buffers in order until one is empty or the product can be built
+        :return: None
+        """
+        while self.collected < len(self.components):
+            component = self.components[self.collected]
+            buffer = self.buffers[component]
+            if buffer.level == 0:
+                self.starved = component
+                return
+            self.components_used.add(self.collected)
+            self.components_held.add(self.collected)
+            if self.tracer is not None:
+                self.tracer.record(self.env.now, self.trace_id, tracing.TOOK, self.trace_components[self.collected],
+                                   self.trace_id, buffer.level - (not buffer.blocked))
+            self.collected += 1
+            if buffer.blocked:  # the freed space lets the first blocked inspector finish its put, level unchanged
+                buffer.blocked.popleft().finish_put()
+            else:
+                buffer.change(-1)
+            self.buffer_levels[component].update(self.env.now, buffer.level)
+
+        self.starved = None
+        if self.env.now >= self.deletion_point:
+            self.wait_time += (self.env.now - self.before_time)
+        self.busy.update(self.env.now, 1)
+        if self.tracer is not None:
+            self.tracer.record(self.env.now, self.trace_id, tracing.STARTED, wait=self.env.now - self.before_time)
+        self.env.schedule(self.processing_times.draw(), self.finish)
+
+    def receive(self, component: classes.Component):
+        """
+        Called once a component has been put in one of the buffers
+        :param component: the component that was put
+        :return: None
+        """
+        if self.starved is component:
+            self.collect()
+
+    def finish(self):
+        """
+        Finishes building a product
+        :return: None
+        """
+        if self.env.now >= self.deletion_point:
+            self.products_made += 1
+            for position in range(len(self.components)):
+                self.components_held.add(position, -1)
+        if self.tracer is not None:
+            self.tracer.record(self.env.now, self.trace_id, tracing.FINISHED)
+
+        self.busy.update(self.env.now, 0)
+        self.products_time.add(self.env.now)
+        self.start()
+
+
+class Inspector:
+    choose_random_component = classes.Inspector.choose_random_component
+
+    def __init__(self, env: EventEngine, name: str, components: list, processing_times: list,
+                 workstations: list, debug: bool, deletion_point: int, alternate: bool, rng=None,
+                 metrics_on: dict = None, policy: str = None, tracer: tracing.Tracer = None):
+        """
+        Constructor for an inspector
+        :param env: the engine the inspector will be in
+        :param name: of the inspector
+        :param components: the components the inspector will build
+        :param processing_times: the processing times generated in the .dat file, or a sampler drawing them,
+                                 for each component
+        :param workstations: the workstations that the inspector can send components to
+        :param debug: if the debug counters should be kept
+        :param deletion_point: the deletion point of the model
+        :param alternate: if it is the alternate design
+        :param rng: the random.Random choosing the components, the random module if None
+        :param metrics_on: the metrics kept with their options, metrics.DEFAULT_METRICS if None
+        :param policy: the routing policy, one of routing.ROUTERS, first or last depending on alternate if None
+        :param tracer: the tracer recording the events of the run, None to not trace
+        """
+        self.name = name
+        self.components = components
+        self.env = env
+        self.processing_times = {}
+        for i, times in zip(components, processing_times):
+            self.processing_times[i] = as_sampler(times)
+
+        self.workstations = workstations
+        self.blocked_time = 0
+        self.debug = debug
+        self.deletion_point = deletion_point
+        metrics_on = metrics.resolve(metrics_on, debug)
+        self.components_inspected = metrics.counters(metrics_on, [i.name for i in components])
+        self.blocking = metrics.time_weighted(metrics_on, "utilization", deletion_point)
+        self.alternate = alternate
+        self.rng = rng or random
+        self.policy = policy or ("last" if alternate else "first")
+        self.routes = routing.route(workstations, components, self.policy)
+        # the counter of each component and the buffer level metric of each of its candidates, found once
+        self.positions = {i: n for n, i in enumerate(components)}
+        self.levels = {i: [w.buffer_levels[i] for w in self.routes[i][0]] for i in components}
+        self.tracer = tracer
+        if tracer is not None:
+            self.trace_id = tracer.entities[name]
+            self.trace_components = {i: tracer.components[i.name] for i in components}
+        self.component = None
+        self.destination = None
+        self.destination_levels = None
+        self.before_time = 0
+        env.schedule(0, self.start)
+
+    def start(self):
+        """
+        Starts inspecting a randomly chosen component
+        :return: None
+        """
+        self.component = self.choose_random_component()
+        self.env.schedule(self.processing_times[self.component].draw(), self.put)
+
+    def put(self):
+        """
+        Sends the inspected component to a workstation, or blocks until its buffer has space
+        :return: None
+        """
+        self.before_time = self.env.now
+        candidates, router = self.routes[self.component]  # same choice as classes.Inspector.send_component
+        choice = router.choose()
+        self.destination, self.destination_levels = candidates[choice], self.levels[self.component][choice]
+        buffer = self.destination.buffers[self.component]
+        if buffer.level < buffer.capacity:
+            buffer.change(1)
+            self.destination.receive(self.component)
+            self.finish_put()
+        else:
+            buffer.blocked.append(self)
+            if self.tracer is not None:
+                self.tracer.record(self.env.now, self.trace_id, tracing.BLOCKED, self.trace_components[self.component],
+                                   self.tracer.entities[self.destination.name], buffer.level)
+
+    def finish_put(self):
+        """
+        Called once the component is in the buffer of its workstation
+        :return: None
+        """
+        self.components_inspected.add(self.positions[self.component])
+        self.destination_levels.update(self.env.now, self.destination.buffers[self.component].level)
+        if self.env.now > self.before_time:
+            self.blocking.update(self.before_time, 1)
+            self.blocking.update(self.env.now, 0)
+        if self.tracer is not None:
+            self.tracer.record(self.env.now, self.trace_id, tracing.SENT, self.trace_components[self.component],
+                               self.tracer.entities[self.destination.name],
+                               self.destination.buffers[self.component].level, self.env.now - self.before_time)
+
+        if self.env.now >= self.deletion_point:
+            self.blocked_time += (self.env.now - self.before_time)
+        self.start()
+
+
+def shared_buffer_topology() -> dict:
+    """
+    Builds the reference facility with a third inspector of Component 1, so several inspectors can be blocked on
+    the same full buffer at once
+    :return: the topology
+    """
+    from topology import REFERENCE
+
+    streams = dict(REFERENCE["streams"], insp3_time=REFERENCE["streams"]["insp1_time"])
+    spec = dict(REFERENCE, streams=streams)
+    spec["inspectors"] = REFERENCE["inspectors"] + [{"name": "Inspector 3", "components": {"Component 1": "insp3_time"},
+                                                     "workstations": ["Workstation 1", "Workstation 2",
+                                                                      "Workstation 3"]}]
+    return spec
+
+
+def cross_check(config: dict = None, seeds=range(20)) -> list:
+    """
+    Runs replications on both engines with the same random streams
+    :param config: the facility config, checked on the reference facility and on shared_buffer_topology if it has
+                   no topology of its own
+    :param seeds: the seeds of the replications to compare
+    :return: the seeds whose statistics differ between the engines
+    """
+    from replication import run_replication
+
+    config = dict(config or {})
+    topologies = [config["topology"]] if config.get("topology") else [None, shared_buffer_topology()]
+    return [seed for seed in seeds
+            if any(run_replication(dict(config, topology=topology, engine="simpy"), seed) !=
+                   run_replication(dict(config, topology=topology, engine="heap"), seed) for topology in topologies)]
+
+
+if __name__ == "__main__":
+    mismatches = cross_check()
+    print("Engines match" if not mismatches else "Engines differ for seeds: %s" % mismatches)
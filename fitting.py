@@ -0,0 +1,205 @@
+import json
+import os
+import warnings
+
+import numpy as np
+from scipy import special, stats
+
+from inputs import DATA_DIR, DATA_FILES, cache_path, dat_parser, remove_stale
+
+NEWTON_STEPS = 50
+MEAN_TOLERANCE = 0.05  # largest relative error of the mean of a fit before it is ranked below those that keep it
+fitted = {}  # the best fit of each .dat file fitted or read by this process, keyed by cache file
+
+
+def fit_exponential(data: np.ndarray) -> dict:
+    """
+    Fits an exponential distribution by maximum likelihood
+    :param data: the observations
+    :return: the parameters
+    """
+    return {"scale": float(data.mean())}
+
+
+def fit_lognormal(data: np.ndarray) -> dict:
+    """
+    Fits a lognormal distribution by maximum likelihood
+    :param data: the observations
+    :return: the parameters
+    """
+    logs = np.log(data)
+    return {"mu": float(logs.mean()), "sigma": float(logs.std())}
+
+
+def fit_gamma(data: np.ndarray) -> dict:
+    """
+    Fits a gamma distribution by maximum likelihood, solving for the shape with Newton's method
+    from Minka's starting point
+    :param data: the observations
+    :return: the parameters
+    """
+    mean = data.mean()
+    s = np.log(mean) - np.log(data).mean()
+    shape = (3 - s + np.sqrt((s - 3) ** 2 + 24 * s)) / (12 * s)
+    for _ in range(NEWTON_STEPS):
+        step = (np.log(shape) - special.digamma(shape) - s) / (1 / shape - special.polygamma(1, shape))
+        shape -= step
+        if abs(step) < 1e-12 * shape:
+            break
+    return {"shape": float(shape), "scale": float(mean / shape)}
+
+
+def fit_weibull(data: np.ndarray) -> dict:
+    """
+    Fits a Weibull distribution by maximum likelihood, solving the profile likelihood for the shape
+    with Newton's method from the moment estimate of the log data
+    :param data: the observations
+    :return: the parameters
+    """
+    top = data.max()
+    logs = np.log(data / top)  # scaled so the powers cannot overflow
+    mean_log = logs.mean()
+    shape = np.pi / (np.sqrt(6) * logs.std())
+    for _ in range(NEWTON_STEPS):
+        powers = np.exp(shape * logs)
+        total, first, second = powers.sum(), (powers * logs).sum(), (powers * logs ** 2).sum()
+        value = first / total - 1 / shape - mean_log
+        slope = (second * total - first ** 2) / total ** 2 + 1 / shape ** 2
+        step = value / slope
+        shape = max(shape - step, shape / 2)
+        if abs(step) < 1e-12 * shape:
+            break
+    scale = top * np.exp(shape * logs).mean() ** (1 / shape)
+    return {"shape": float(shape), "scale": float(scale)}
+
+
+DISTRIBUTIONS = {
+    "exponential": (fit_exponential, lambda p: stats.expon(scale=p["scale"])),
+    "weibull": (fit_weibull, lambda p: stats.weibull_min(p["shape"], scale=p["scale"])),
+    "lognormal": (fit_lognormal, lambda p: stats.lognorm(p["sigma"], scale=np.exp(p["mu"]))),
+    "gamma": (fit_gamma, lambda p: stats.gamma(p["shape"], scale=p["scale"])),
+}
+
+
+def frozen(fit: dict):
+    """
+    Builds the distribution of a fit
+    :param fit: the fit, with its distribution and parameters
+    :return: the frozen scipy.stats distribution
+    """
+    return DISTRIBUTIONS[fit["distribution"]][1](fit["params"])
+
+
+def goodness(data: np.ndarray, distribution, n_params: int, bins: int = None) -> dict:
+    """
+    Measures how well a distribution fits the data
+    :param data: the sorted observations
+    :param distribution: the frozen distribution
+    :param n_params: the number of fitted parameters, taken off the chi-square degrees of freedom
+    :param bins: the number of equiprobable chi-square bins, the square root of the number of observations if None
+    :return: the Kolmogorov-Smirnov statistic and p-value, the chi-square statistic and p-value, and the correlation
+             of the Q-Q plot
+    """
+    n = len(data)
+    bins = bins or max(n_params + 2, int(np.sqrt(n)))
+    probabilities = distribution.cdf(data)
+
+    ks = stats.kstest(data, distribution.cdf)
+    observed = np.bincount(np.minimum((probabilities * bins).astype(int), bins - 1), minlength=bins)
+    chi2 = float(((observed - n / bins) ** 2).sum() / (n / bins))
+    quantiles = distribution.ppf((np.arange(1, n + 1) - 0.5) / n)
+    return {"ks": float(ks.statistic), "ks_p": float(ks.pvalue),
+            "chi2": chi2, "chi2_p": float(stats.chi2.sf(chi2, bins - 1 - n_params)),
+            "qq": float(np.corrcoef(data, quantiles)[0, 1])}
+
+
+def rank(fits: list):
+    """
+    Ranks fits on all the goodness of fit measures at once, adding up their places by the Kolmogorov-Smirnov
+    statistic, the chi-square p-value and the Q-Q correlation
+    :param fits: the fits, with their goodness of fit
+    :return: None, each fit gets its rank, lower is better
+    """
+    for fit in fits:
+        fit["rank"] = 0
+    for measure, better in (("ks", 1), ("chi2_p", -1), ("qq", -1)):
+        for place, fit in enumerate(sorted(fits, key=lambda f: better * f[measure])):
+            fit["rank"] += place
+
+
+def fit_data(data, distributions: list = None) -> list:
+    """
+    Fits every candidate distribution to the data and ranks the fits, best first by their combined places on the
+    Kolmogorov-Smirnov, chi-square and Q-Q measures, after any fit whose mean is within MEAN_TOLERANCE of the
+    sample mean. The p-values are approximate, as the parameters are estimated from the same data.
+    :param data: the observations, all positive
+    :param distributions: the names of the candidate distributions, all of DISTRIBUTIONS if None
+    :return: the fits, each with its distribution, parameters, goodness of fit, rank, mean, the relative error of
+             the mean and if that error is within MEAN_TOLERANCE
+    """
+    data = np.sort(np.asarray(data, dtype=float))
+    if len(data) < 2 or data[0] <= 0:
+        raise ValueError("fitting needs at least two observations, all positive")
+    fits = []
+    for name in distributions or DISTRIBUTIONS:
+        fit = {"distribution": name, "params": DISTRIBUTIONS[name][0](data)}
+        distribution = frozen(fit)
+        fit.update(goodness(data, distribution, len(fit["params"])))
+        fit["mean"] = float(distribution.mean())
+        fit["mean_error"] = float(abs(fit["mean"] - data.mean()) / data.mean())
+        fit["mean_ok"] = bool(fit["mean_error"] <= MEAN_TOLERANCE)
+        fits.append(fit)
+    rank(fits)
+    return sorted(fits, key=lambda fit: (not fit["mean_ok"], fit["rank"], fit["ks"]))
+
+
+def fit_file(filename: str, refit: bool = False) -> list:
+    """
+    Fits the data of a .dat file, keeping the fits next to its .npy cache so they are only redone
+    when the file changes
+    :param filename: the .dat file
+    :param refit: if the cached fits should be ignored
+    :return: the fits, best first
+    """
+    path = cache_path(filename, True)[:-len(".npy")] + ".fit.json"
+    if not refit:
+        try:
+            with open(path) as f:
+                fits = json.load(f)
+            if all("rank" in fit for fit in fits):  # fits cached before the combined ranking are redone
+                return fits
+        except FileNotFoundError:
+            pass
+
+    fits = fit_data(dat_parser(filename, sort=True))
+    temporary = "%s.%d.tmp" % (path, os.getpid())
+    with open(temporary, "w") as f:
+        json.dump(fits, f, indent=1)
+    os.replace(temporary, path)
+    remove_stale(path, ".fit.json")
+    return fits
+
+
+def best_fit(filename: str):
+    """
+    Returns the best fitting distribution of a .dat file, warning if no fit keeps the sample mean
+    :param filename: the .dat file
+    :return: the frozen scipy.stats distribution
+    """
+    key = cache_path(filename, True)
+    if key not in fitted:
+        best = fit_file(filename)[0]
+        if not best["mean_ok"]:
+            warnings.warn("the best fit of %s, %s, has a mean %.1f%% off the sample mean"
+                          % (filename, best["distribution"], 100 * best["mean_error"]))
+        fitted[key] = frozen(best)
+    return fitted[key]
+
+
+if __name__ == "__main__":
+    for stream, name in DATA_FILES.items():
+        for fit in fit_file(os.path.join(DATA_DIR, name), refit=True):
+            print("%-12s %-12s %-45s KS %.4f (p %.3f)  chi2 %7.2f (p %.3f)  Q-Q %.4f  mean %.4f (%.1f%% off)%s"
+                  % (stream, fit["distribution"], json.dumps(fit["params"]), fit["ks"], fit["ks_p"], fit["chi2"],
+                     fit["chi2_p"], fit["qq"], fit["mean"], 100 * fit["mean_error"],
+                     "" if fit["mean_ok"] else "  FLAGGED"))
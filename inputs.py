@@ -0,0 +1,116 @@
+import glob
+import hashlib
+import os
+
+import numpy as np
+
+SIZE = 1000
+MEANS = {"insp1_time": 10.35791, "insp22_time": 15.53690333, "insp23_time": 20.63275667,
+         "ws1_time": 4.604416667, "ws2_time": 11.09260667, "ws3_time": 8.79558}
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data_files")
+DATA_FILES = {"insp1_time": "servinsp1.dat", "insp22_time": "servinsp22.dat", "insp23_time": "servinsp23.dat",
+              "ws1_time": "ws1.dat", "ws2_time": "ws2.dat", "ws3_time": "ws3.dat"}
+CACHE_DIR = os.path.join(DATA_DIR, "cache")
+loaded = {}  # the memory-mapped arrays opened by this process, keyed by cache file
+
+
+def cache_path(filename: str, sort: bool) -> str:
+    """
+    Names the .npy cache of a .dat file, <name>-<path hash>[-sorted]-<version hash>.npy, whose version hash
+    changes whenever the file is modified
+    :param filename: the .dat file
+    :param sort: if the cache holds the sorted data
+    :return: the path of the cache
+    """
+    stat = os.stat(filename)
+    source = os.path.abspath(filename)
+    key = "%s|%d|%d" % (source, stat.st_size, stat.st_mtime_ns)
+    name = "%s-%s%s" % (os.path.splitext(os.path.basename(filename))[0], hashlib.sha1(source.encode()).hexdigest()[:8],
+                        "-sorted" if sort else "")
+    return os.path.join(CACHE_DIR, "%s-%s.npy" % (name, hashlib.sha1(key.encode()).hexdigest()[:16]))
+
+
+def remove_stale(path: str, suffix: str):
+    """
+    Removes the caches of older versions of the same file, keeping the current one
+    :param path: the current cache
+    :param suffix: the extension of the cache, e.g. ".npy"
+    :return: None
+    """
+    for stale in glob.glob(path[:-len(suffix)].rsplit("-", 1)[0] + "-" + "?" * 16 + suffix):
+        if stale != path:
+            try:
+                os.remove(stale)
+            except FileNotFoundError:  # removed by another process
+                pass
+
+
+def dat_parser(filename: str, sort: bool = False) -> np.ndarray:
+    """
+    Converts .dat file to numpy array.
+    The file is parsed once and kept as a .npy cache, which every later call, in any process, memory maps
+    read-only instead of parsing the text again.
+    :param filename: the .dat file to be opened
+    :param sort: if the data should be sorted, as the samplers need it
+    :return: a read-only array of the data
+    """
+    path = cache_path(filename, sort)
+    if path in loaded:
+        return loaded[path]
+    try:
+        loaded[path] = np.load(path, mmap_mode="r")
+        return loaded[path]
+    except FileNotFoundError:
+        pass
+
+    data = np.loadtxt(filename, dtype=float, ndmin=1)
+    if sort:
+        data.sort()
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    temporary = "%s.%d.tmp" % (path, os.getpid())
+    with open(temporary, "wb") as f:
+        np.save(f, data)
+    os.replace(temporary, path)  # other processes never see a half written cache
+    remove_stale(path, ".npy")
+    try:
+        loaded[path] = np.load(path, mmap_mode="r")
+    except FileNotFoundError:  # removed as stale by a process that saw a newer version of the file
+        data.setflags(write=False)
+        loaded[path] = data
+    return loaded[path]
+
+
+def generate_input(mean: int) -> list:
+    """
+    Generate a random exponential distribution
+    :param mean: mean of the distribution
+    :return: a list of numbers
+    """
+    return list(np.random.exponential(mean, SIZE))
+
+
+def data_path(data_files: dict, key: str, use: str) -> str:
+    """
+    Finds the .dat file of a stream
+    :param data_files: the .dat file of each stream, relative to DATA_DIR
+    :param key: the stream
+    :param use: what the data is needed for, for the error message
+    :return: the path of the file
+    """
+    if not data_files.get(key):
+        raise ValueError("stream %s has no .dat file, which %s needs" % (key, use))
+    return os.path.join(DATA_DIR, data_files[key])
+
+
+def generate_inputs(means: dict, default: bool, data_files: dict = None) -> dict:
+    """
+    Generates the processing times for every inspector and workstation stream
+    :param means: mean of each stream, keyed like MEANS
+    :param default: if the .dat files should be used instead of generated times
+    :param data_files: the .dat file of each stream, relative to DATA_DIR, DATA_FILES if None
+    :return: the processing times keyed like means, the .dat data sorted
+    """
+    data_files = data_files or DATA_FILES
+    if default:
+        return {key: dat_parser(data_path(data_files, key, "default times"), sort=True) for key in means}
+    return {key: generate_input(means[key]) for key in means}
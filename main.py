@@ -1,348 +1,351 @@
-# Main script
+# Main script: the replication study as a library call, and the command line to run it
+#
+#   python main.py run --runs 50 --seed 1 --format csv --output study.csv
+#   python main.py sweep --parameters ws1_time --steps 21 --plot
+#   python main.py compare --runs 50 --antithetic
+#
+# Results are written as JSON (default) or CSV, to stdout or --output. Matplotlib is only loaded with --plot and
+# SciPy only once a confidence interval is computed, so headless workers start fast.
+
+import argparse
+import contextlib
+import csv
+import json
+import sys
 
-from statistics import stdev
-
-import matplotlib.pyplot as plt
 import numpy as np
-import simpy
-from scipy import stats
 
-from classes import Product, Component, Workstation, Inspector
+from analysis import CONFIDENCE, generate_confidence
+from compare import compare_policies
+from replication import ENGINES, make_config, resolve_deletion_point, run_replications, simulate
+from routing import ROUTERS
+from samplers import SAMPLING
+from sweep import expand_grid, run_sweep
+from topology import compile_topology
 
-SIZE = 1000
 RUNS = 50
-MAX_MINUTES = 3300
-DELETION_POINT = 300
-default = False
-debug = False
-plot = False
-sensitivity = False
-alternate = True
+SWEEP_STEPS = 101
+SWEEP_DEVIATION = 0.5  # vary each input value by +-50%
+SWEEP_REPLICATIONS = 1
+SWEEP_STORE = "sensitivity.jsonl"  # finished points are kept here so an interrupted sweep can resume
+ENTITIES = {"blocked_time": "inspectors", "wait_time": "workstations", "products_made": "workstations",
+            "insp_blocked_rate": "inspectors", "ws_utilization": "workstations", "ws_throughput": "workstations"}
 
 
-def dat_parser(filename: str) -> list:
+def entity_names(config: dict) -> dict:
     """
-    Converts .dat file to numpy array
-    :param filename: the .dat file to be opened
-    :return:
+    Names the inspectors and workstations of the facility, in the column order of the metric arrays
+    :param config: the facility config
+    :return: the names of the inspectors and of the workstations
     """
-    return list(np.loadtxt(filename))
+    model = compile_topology(config["topology"])
+    return {"inspectors": [i[0] for i in model.inspectors], "workstations": [w[0] for w in model.workstations]}
 
 
-def generate_input(mean: int) -> list:
+def describe(values: np.ndarray, confidence: float = CONFIDENCE) -> list:
     """
-    Generate a random exponential distribution
-    :param mean: mean of the distribution
-    :return: a list of numbers
+    Summarizes a metric across replications
+    :param values: one row per replication, one column per inspector or workstation
+    :param confidence: the confidence level of the intervals
+    :return: the mean, standard deviation and confidence interval of each column, the last two None for one run
     """
-    return list(np.random.exponential(mean, SIZE))
+    summary = []
+    for column in values.T:
+        precise = len(column) > 1
+        summary.append({"mean": float(column.mean()), "std": float(column.std(ddof=1)) if precise else None,
+                        "confidence": list(map(float, generate_confidence(column, confidence))) if precise else None})
+    return summary
 
 
-def generate_confidence(lst: list):
+def last_run(config: dict, seed: int) -> dict:
+    """
+    Repeats a replication in this process to report what the metric arrays do not keep
+    :param config: the facility config
+    :param seed: the seed of the replication
+    :return: the products made per minute by each workstation and, in debug mode, the components inspected and
+             used by each entity and if each component was conserved
+    """
+    metrics_on = dict(config["metrics"] or {}, products_time={"width": 1})
+    inspectors, workstations = simulate(dict(config, metrics=metrics_on), seed)
+    run = {"products_time": {w.name: w.products_time.to_array(config["max_minutes"]).tolist()
+                             for w in workstations}}
+    if config["debug"]:
+        inspected, buffered, used = {}, {}, {}
+        for i in inspectors:
+            for name, count in i.components_inspected.items():
+                inspected[name] = inspected.get(name, 0) + count
+        for w in workstations:
+            for c, buffer in w.buffers.items():
+                buffered[c.name] = buffered.get(c.name, 0) + buffer.level
+            for name, count in w.components_used.items():
+                used[name] = used.get(name, 0) + count
+        run["inspected"] = {i.name: dict(i.components_inspected.items()) for i in inspectors}
+        run["used"] = {w.name: dict(w.components_used.items()) for w in workstations}
+        run["conserved"] = {name: inspected[name] == buffered.get(name, 0) + used.get(name, 0) for name in inspected}
+    return run
+
+
+def run_study(config: dict = None, runs: int = RUNS, seed=None, workers: int = None,
+              confidence: float = CONFIDENCE, keep_last: bool = False) -> dict:
+    """
+    Runs a replication study of the facility and summarizes it
+    :param config: the facility config, its deletion point may be "auto" to pick it from short pilot runs
+    :param runs: the number of replications
+    :param seed: the seed of the study, None for fresh entropy
+    :param workers: the number of worker processes, 1 to run in this process
+    :param confidence: the confidence level of the intervals
+    :param keep_last: if the last replication should be repeated to report its per minute output, always done in
+                      debug mode
+    :return: the config and seeds used, and the blocked time of every inspector and the wait time, products made,
+             throughput, utilization and mean service time of every workstation, keyed by name
+    """
+    config = resolve_deletion_point(config, seed, workers)
+    results = run_replications(dict(config, debug=False), runs, seed, workers)
+    names = entity_names(config)
+    measured = config["max_minutes"] - config["deletion_point"]
+
+    study = {"config": config, "runs": runs, "seeds": results["seeds"], "measured_minutes": measured,
+             "inspectors": {}, "workstations": {}}
+    blocked = describe(results["blocked_time"], confidence)
+    for name, summary, column in zip(names["inspectors"], blocked, results["blocked_time"].T):
+        study["inspectors"][name] = {"blocked_time": summary, "blocked_rate": float(column.mean()) / measured}
+
+    waits = describe(results["wait_time"], confidence)
+    products = describe(results["products_made"], confidence)
+    for n, name in enumerate(names["workstations"]):
+        wait, made = results["wait_time"][:, n].mean(), results["products_made"][:, n].mean()
+        study["workstations"][name] = {"wait_time": waits[n], "products_made": products[n],
+                                       "throughput": float(made) / measured,
+                                       "utilization": float(measured - wait) / measured,
+                                       "mean_service_time": float(measured - wait) / made if made else None}
+
+    if keep_last or config["debug"]:
+        study["last_run"] = last_run(config, results["seeds"][-1])
+    return study
+
+
+def study_rows(study: dict) -> list:
+    """
+    Flattens a study to one row per entity and metric
+    :param study: the output of run_study
+    :return: the rows, with the entity, metric, mean, standard deviation and confidence interval
     """
-    Used to generate the confidence intervals
-    :param lst: the data to be passed in
-    :return: the confidence interval
+    rows = []
+    for group in ("inspectors", "workstations"):
+        for entity, entity_metrics in study[group].items():
+            for metric, value in entity_metrics.items():
+                if isinstance(value, dict):
+                    low, high = value["confidence"] or (None, None)
+                    rows.append([entity, metric, value["mean"], value["std"], low, high])
+                else:
+                    rows.append([entity, metric, value, None, None, None])
+    return [["entity", "metric", "mean", "std", "lower", "upper"]] + rows
+
+
+def sweep_rows(points: list, records: dict, names: dict) -> list:
     """
-    confidence = 0.95
-    v = RUNS - 1
-    mean, error = np.mean(lst), stats.sem(lst)
-    h = error * stats.t.ppf((1 + confidence) / 2, v)
-    return mean - h, mean + h
+    Flattens a sweep to one row per grid point, metric and entity
+    :param points: the grid points from expand_grid
+    :param records: the records of the sweep keyed by point
+    :param names: the names of the inspectors and workstations
+    :return: the rows, with the mean varied, its change in percent, the entity, metric, mean and confidence interval
+    """
+    rows = [["parameter", "change", "entity", "metric", "mean", "lower", "upper"]]
+    for p in points:
+        record = records[p["key"]]
+        for metric, means in record["mean"].items():
+            intervals = record["confidence"].get(metric) or [(None, None)] * len(means)
+            for entity, mean, (low, high) in zip(names[ENTITIES[metric]], means, intervals):
+                rows.append([p["parameter"], p["change"], entity, metric, mean, low, high])
+    return rows
 
 
-# Main Script
-if __name__ == "__main__":
-    print("Starting Simulation ")
-
-    insp1_wait = []
-    insp2_wait = []
-
-    ws1_wait = []
-    ws2_wait = []
-    ws3_wait = []
-
-    ws1_products = []
-    ws2_products = []
-    ws3_products = []
-
-    if sensitivity:
-        MEANS = {"insp1_time": 10.35791, "insp22_time": 15.53690333, "insp23_time": 20.63275667,
-                 "ws1_time": 4.604416667, "ws2_time": 11.09260667, "ws3_time": 8.79558}
-        steps = 101
-        deviation = 0.5  # vary each input value by +-50%
-        changes = np.linspace(-deviation * 100, deviation * 100, steps)
-        MEAS_TIME = MAX_MINUTES - DELETION_POINT  # time after deletion point over which data is measured
-        for m in MEANS:
-            newMEANS = dict(MEANS)
-            insp1_wait_rate = []
-            insp2_wait_rate = []
-            ws1_throughput = []
-            ws2_throughput = []
-            ws3_throughput = []
-            ws1_util = []
-            ws2_util = []
-            ws3_util = []
-            for n in range(steps):
-                newMEANS[m] = MEANS[m] * ((n / (steps - 1)) + deviation)
-                insp1_time = generate_input(newMEANS["insp1_time"])
-                insp22_time = generate_input(newMEANS["insp22_time"])
-                insp23_time = generate_input(newMEANS["insp23_time"])
-                ws1_time = generate_input(newMEANS["ws1_time"])
-                ws2_time = generate_input(newMEANS["ws2_time"])
-                ws3_time = generate_input(newMEANS["ws3_time"])
-
-                env = simpy.Environment()
-
-                component1 = Component("Component 1")
-                component2 = Component("Component 2")
-                component3 = Component("Component 3")
-
-                product1 = Product("Product 1", [component1])
-                product2 = Product("Product 2", [component1, component2])
-                product3 = Product("Product 3", [component1, component3])
-
-                workstation1 = Workstation(env, "Workstation 1", product1, ws1_time, debug, DELETION_POINT)
-                workstation2 = Workstation(env, "Workstation 2", product2, ws2_time, debug, DELETION_POINT)
-                workstation3 = Workstation(env, "Workstation 3", product3, ws3_time, debug, DELETION_POINT)
-
-                inspector1 = Inspector(env, "Inspector 1", [component1], [insp1_time],
-                                       [workstation1, workstation2, workstation3], debug, DELETION_POINT, alternate)
-                inspector2 = Inspector(env, "Inspector 2", [component2, component3], [insp22_time, insp23_time],
-                                       [workstation2, workstation3], debug, DELETION_POINT, alternate)
-
-                env.run(until=MAX_MINUTES)
-
-                insp1_wait_rate.append(inspector1.blocked_time / MEAS_TIME)
-                insp2_wait_rate.append(inspector2.blocked_time / MEAS_TIME)
-
-                ws1_util.append((MEAS_TIME - workstation1.wait_time) / MEAS_TIME)
-                ws2_util.append((MEAS_TIME - workstation2.wait_time) / MEAS_TIME)
-                ws3_util.append((MEAS_TIME - workstation3.wait_time) / MEAS_TIME)
-
-                ws1_throughput.append(workstation1.products_made / MEAS_TIME)
-                ws2_throughput.append(workstation2.products_made / MEAS_TIME)
-                ws3_throughput.append(workstation3.products_made / MEAS_TIME)
-            plt.plot(changes, insp1_wait_rate)
-            plt.plot(changes, insp2_wait_rate)
-            plt.xlabel("% Change in " + m)
-            plt.ylabel("% Time Idle")
-            plt.xticks([-50, -25, 0, 25, 50])
-            plt.title("Sensitivity of Inspector Idle Time")
-            plt.legend(["Inspector 1", "Inspector 2"])
-            plt.show()
+def comparison_rows(comparison: dict, names: dict) -> list:
+    """
+    Flattens a policy comparison to one row per metric and entity
+    :param comparison: the output of compare.compare_policies
+    :param names: the names of the inspectors and workstations
+    :return: the rows, with the entity, metric, mean of each policy, and the mean, confidence interval and variance
+             reduction of the difference
+    """
+    rows = [["entity", "metric", "standard", "alternate", "difference", "lower", "upper", "variance_reduction"]]
+    for metric in comparison["difference"]:
+        for n, entity in enumerate(names[ENTITIES[metric]]):
+            low, high = comparison["confidence"][metric][n]
+            rows.append([entity, metric, comparison["standard"][metric][n], comparison["alternate"][metric][n],
+                         comparison["difference"][metric][n], low, high, comparison["variance_reduction"][metric][n]])
+    return rows
+
+
+def to_json(value):
+    """
+    Converts the NumPy values json cannot write
+    :param value: the value
+    :return: the value as plain Python
+    """
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    raise TypeError("%s is not JSON serializable" % type(value).__name__)
+
+
+def write_output(data, rows: list, fmt: str, path: str = None):
+    """
+    Writes results as JSON or CSV
+    :param data: the results, written as JSON
+    :param rows: the results as rows, header first, written as CSV
+    :param fmt: "json" or "csv"
+    :param path: the file written, None for stdout
+    :return: None
+    """
+    with (open(path, "w", newline="") if path else contextlib.nullcontext(sys.stdout)) as out:
+        if fmt == "csv":
+            csv.writer(out).writerows(rows)
+        else:
+            json.dump(data, out, indent=1, default=to_json)
+            out.write("\n")
 
-            plt.plot(changes, ws1_util)
-            plt.plot(changes, ws2_util)
-            plt.plot(changes, ws3_util)
-            plt.xlabel("% Change in " + m)
-            plt.ylabel("Utilization (%)")
-            plt.xticks([-50, -25, 0, 25, 50])
-            plt.title("Sensitivity of Workstation Utilization")
-            plt.legend(["Workstation 1", "Workstation 2", "Workstation 3"])
-            plt.show()
 
-            plt.plot(changes, ws1_throughput)
-            plt.plot(changes, ws2_throughput)
-            plt.plot(changes, ws3_throughput)
+def plot_products(study: dict):
+    """
+    Plots the products made per minute by every workstation in the last replication of a study
+    :param study: the output of run_study with its last run kept
+    :return: None
+    """
+    import matplotlib.pyplot as plt
+
+    for name, counts in study["last_run"]["products_time"].items():
+        plt.plot(counts)
+        plt.title("Products made by " + name + " by Minute")
+        plt.xlabel("Minutes")
+        plt.xticks(np.arange(0, study["config"]["max_minutes"] + 1, 250))
+        plt.ylabel("Products Made")
+        plt.show()
+
+
+def plot_sensitivity(points: list, records: dict, names: dict):
+    """
+    Plots the inspector idle time and the workstation utilization and throughput against the change of each mean
+    :param points: the grid points from expand_grid
+    :param records: the records of the sweep keyed by point
+    :param names: the names of the inspectors and workstations
+    :return: None
+    """
+    import matplotlib.pyplot as plt
+
+    charts = (("insp_blocked_rate", "% Time Idle", "Sensitivity of Inspector Idle Time"),
+              ("ws_utilization", "Utilization (%)", "Sensitivity of Workstation Utilization"),
+              ("ws_throughput", "Throughput (products/minute)", "Sensitivity of Workstation Throughput"))
+    for m in dict.fromkeys(p["parameter"] for p in points):
+        sweep = [records[p["key"]] for p in points if p["parameter"] == m]
+        changes = [r["change"] for r in sweep]
+        for metric, label, title in charts:
+            plt.plot(changes, [r["mean"][metric] for r in sweep])
             plt.xlabel("% Change in " + m)
-            plt.ylabel("Throughput (products/minute)")
-            plt.xticks([-50, -25, 0, 25, 50])
-            plt.title("Sensitivity of Workstation Throughput")
-            plt.legend(["Workstation 1", "Workstation 2", "Workstation 3"])
+            plt.ylabel(label)
+            plt.xticks(np.linspace(changes[0], changes[-1], 5))
+            plt.title(title)
+            plt.legend(names[ENTITIES[metric]])
             plt.show()
 
-    else:
-        for i in range(RUNS):
-
-            if default:
-                insp1_time = dat_parser("data_files/servinsp1.dat")
-                insp22_time = dat_parser("data_files/servinsp22.dat")
-                insp23_time = dat_parser("data_files/servinsp23.dat")
-                ws1_time = dat_parser("data_files/ws1.dat")
-                ws2_time = dat_parser("data_files/ws2.dat")
-                ws3_time = dat_parser("data_files/ws3.dat")
-            #        elif debug:
-            #            insp1_time = [5] * SIZE  # make every time 5 minutes to see if clock is working
-            #            insp22_time = [5] * SIZE
-            #            insp23_time = [5] * SIZE
-            #            ws1_time = [5] * SIZE
-            #            ws2_time = [5] * SIZE
-            #            ws3_time = [5] * SIZE
-            #            MAX_MINUTES = 250
+
+def make_parser() -> argparse.ArgumentParser:
+    """
+    Builds the command line parser
+    :return: the parser
+    """
+    facility = argparse.ArgumentParser(add_help=False)
+    facility.add_argument("--config", help="JSON file of facility config overrides")
+    facility.add_argument("--max-minutes", type=int, help="the length of each replication")
+    facility.add_argument("--deletion-point", help='minutes left out of the statistics, or "auto"')
+    facility.add_argument("--standard", action="store_true", help="use the standard policy instead of the alternate")
+    facility.add_argument("--default", action="store_true", help="use the default service times")
+    facility.add_argument("--sampling", choices=SAMPLING, help="how service times are drawn")
+    facility.add_argument("--engine", choices=list(ENGINES), help="the event engine")
+    facility.add_argument("--topology", help="JSON or YAML file describing the facility")
+    facility.add_argument("--policy", choices=list(ROUTERS), help="the routing policy of every inspector")
+    facility.add_argument("--seed", type=int, help="the seed of the study, fresh entropy if left out")
+    facility.add_argument("--workers", type=int, help="worker processes, one per core if left out")
+    facility.add_argument("--format", choices=("json", "csv"), default="json", help="the output format")
+    facility.add_argument("--output", help="the file written, stdout if left out")
+    facility.add_argument("--plot", action="store_true", help="show the plots")
+
+    parser = argparse.ArgumentParser(description="Simulate the manufacturing facility")
+    commands = parser.add_subparsers(dest="command")
+    run = commands.add_parser("run", parents=[facility], help="run a replication study")
+    run.add_argument("--runs", type=int, default=RUNS, help="the number of replications")
+    run.add_argument("--debug", action="store_true", help="report the component counts of the last replication")
+    sweep = commands.add_parser("sweep", parents=[facility], help="run a sensitivity sweep of the means")
+    sweep.add_argument("--parameters", nargs="+", help="the streams whose means are varied, all if left out")
+    sweep.add_argument("--steps", type=int, default=SWEEP_STEPS, help="points per mean")
+    sweep.add_argument("--deviation", type=float, default=SWEEP_DEVIATION, help="largest relative change of a mean")
+    sweep.add_argument("--replications", type=int, default=SWEEP_REPLICATIONS, help="replications per point")
+    sweep.add_argument("--store", default=SWEEP_STORE, help="results store the sweep resumes from")
+    compare = commands.add_parser("compare", parents=[facility], help="compare the standard and alternate policy")
+    compare.add_argument("--runs", type=int, default=RUNS, help="the number of seeds, each run under both policies")
+    compare.add_argument("--antithetic", action="store_true", help="also run every seed with antithetic variates")
+    return parser
+
+
+def make_study_config(args: argparse.Namespace) -> dict:
+    """
+    Builds the facility config of a command
+    :param args: the parsed command line
+    :return: the facility config
+    """
+    config = {}
+    if args.config:
+        with open(args.config) as f:
+            config.update(json.load(f))
+    if args.deletion_point is not None:
+        config["deletion_point"] = args.deletion_point if args.deletion_point == "auto" else int(args.deletion_point)
+    options = {"max_minutes": args.max_minutes, "sampling": args.sampling, "engine": args.engine,
+               "topology": args.topology, "policy": args.policy, "debug": getattr(args, "debug", None) or None}
+    config.update({key: value for key, value in options.items() if value is not None})
+    if args.standard:
+        config["alternate"] = False
+    if args.default:
+        config["default"] = True
+    return make_config(config)
+
+
+def main(argv: list = None) -> int:
+    """
+    Runs a command of the command line
+    :param argv: the arguments, a replication study with the defaults if empty
+    :return: the exit status
+    """
+    parser = make_parser()
+    args = parser.parse_args(argv or sys.argv[1:] or ["run"])
+    config = make_study_config(args)
+    if args.command == "sweep":
+        model = compile_topology(config["topology"])
+        unknown = [p for p in args.parameters or () if p not in model.streams]
+        if unknown:
+            parser.error("the facility has no stream %s, choose from %s"
+                         % (", ".join(unknown), ", ".join(model.streams)))
+    # the simulation's debug printing goes to stderr so stdout only holds the results
+    with contextlib.redirect_stdout(sys.stderr):
+        if args.command == "run":
+            data = run_study(config, args.runs, args.seed, args.workers, keep_last=args.plot)
+            rows = study_rows(data)
+        else:
+            config = resolve_deletion_point(config, args.seed, args.workers)
+            names = entity_names(config)
+            if args.command == "sweep":
+                points = expand_grid(model.means(config["means"]), args.parameters, args.steps, args.deviation)
+                records = run_sweep(points, args.store, config, args.replications, args.seed, args.workers)
+                data, rows = [records[p["key"]] for p in points], sweep_rows(points, records, names)
             else:
-                MEANS = {"insp1_time": 10.35791, "insp22_time": 15.53690333, "insp23_time": 20.63275667,
-                         "ws1_time": 4.604416667, "ws2_time": 11.09260667, "ws3_time": 8.79558}
-                insp1_time = generate_input(MEANS["insp1_time"])
-                insp22_time = generate_input(MEANS["insp22_time"])
-                insp23_time = generate_input(MEANS["insp23_time"])
-                ws1_time = generate_input(MEANS["ws1_time"])
-                ws2_time = generate_input(MEANS["ws2_time"])
-                ws3_time = generate_input(MEANS["ws3_time"])
-
-            env = simpy.Environment()
-
-            component1 = Component("Component 1")
-            component2 = Component("Component 2")
-            component3 = Component("Component 3")
-
-            product1 = Product("Product 1", [component1])
-            product2 = Product("Product 2", [component1, component2])
-            product3 = Product("Product 3", [component1, component3])
-
-            workstation1 = Workstation(env, "Workstation 1", product1, ws1_time, debug, DELETION_POINT)
-            workstation2 = Workstation(env, "Workstation 2", product2, ws2_time, debug, DELETION_POINT)
-            workstation3 = Workstation(env, "Workstation 3", product3, ws3_time, debug, DELETION_POINT)
-
-            inspector1 = Inspector(env, "Inspector 1", [component1], [insp1_time],
-                                   [workstation1, workstation2, workstation3], debug, DELETION_POINT, alternate)
-            inspector2 = Inspector(env, "Inspector 2", [component2, component3], [insp22_time, insp23_time],
-                                   [workstation2, workstation3], debug, DELETION_POINT, alternate)
-
-            env.run(until=MAX_MINUTES)
-            print("Finished Run", i + 1)
-
-            insp1_wait.append(inspector1.blocked_time)
-            insp2_wait.append(inspector2.blocked_time)
-
-            ws1_wait.append(workstation1.wait_time)
-            ws2_wait.append(workstation2.wait_time)
-            ws3_wait.append(workstation3.wait_time)
-
-            ws1_products.append(workstation1.products_made)
-            ws2_products.append(workstation2.products_made)
-            ws3_products.append(workstation3.products_made)
-
-        print("")
-        MAX_MINUTES = MAX_MINUTES - DELETION_POINT
-        avg_insp1_wait = sum(insp1_wait) / len(insp1_wait)
-        avg_insp2_wait = sum(insp2_wait) / len(insp2_wait)
-
-        avg_ws1_wait = sum(ws1_wait) / len(ws1_wait)
-        avg_ws2_wait = sum(ws2_wait) / len(ws2_wait)
-        avg_ws3_wait = sum(ws3_wait) / len(ws3_wait)
-
-        avg_ws1_prods = sum(ws1_products) / len(ws1_products)
-        avg_ws2_prods = sum(ws2_products) / len(ws2_products)
-        avg_ws3_prods = sum(ws3_products) / len(ws3_products)
-
-        insp1_wait_conf = generate_confidence(insp1_wait)
-        insp2_wait_conf = generate_confidence(insp2_wait)
-        ws1_wait_conf = generate_confidence(ws1_wait)
-        ws2_wait_conf = generate_confidence(ws2_wait)
-        ws3_wait_conf = generate_confidence(ws3_wait)
-        ws1_prods_conf = generate_confidence(ws1_products)
-        ws2_prods_conf = generate_confidence(ws2_products)
-        ws3_prods_conf = generate_confidence(ws3_products)
-
-        std_insp1_wait = stdev(insp1_wait)
-        std_insp2_wait = stdev(insp2_wait)
-
-        std_ws1_wait = stdev(ws1_wait)
-        std_ws2_wait = stdev(ws2_wait)
-        std_ws3_wait = stdev(ws3_wait)
-
-        std_ws1_prods = stdev(ws1_products)
-        std_ws2_prods = stdev(ws2_products)
-        std_ws3_prods = stdev(ws3_products)
-
-        print(inspector1.name, " wait time: ", avg_insp1_wait)
-        print(inspector1.name, " wait time confidence intervals: ", insp1_wait_conf[:2])
-        print(inspector2.name, " wait time: ", avg_insp2_wait)
-        print(inspector2.name, " wait time confidence intervals: ", insp2_wait_conf[:2])
-        print("")
-        print(inspector1.name, " wait time percent: ", avg_insp1_wait / MAX_MINUTES)
-        print(inspector2.name, " wait time percent: ", avg_insp2_wait / MAX_MINUTES)
-        print("")
-        print(inspector1.name, " wait time standard deviation: ", std_insp1_wait)
-        print(inspector2.name, " wait time standard deviation: ", std_insp2_wait)
-        print("")
-        if debug:
-            for i in [inspector1, inspector2]:
-                print("DEBUG: ", i.name, " inspected:")
-                for c in i.components_inspected:
-                    print("\t", c, ": ", i.components_inspected[c])
-            print("")
-        print(workstation1.name, " wait time: ", avg_ws1_wait)
-        print(workstation1.name, " wait time confidence intervals: ", ws1_wait_conf[:2])
-        print(workstation2.name, " wait time: ", avg_ws2_wait)
-        print(workstation2.name, " wait time confidence intervals: ", ws2_wait_conf[:2])
-        print(workstation3.name, " wait time: ", avg_ws3_wait)
-        print(workstation3.name, " wait time confidence intervals: ", ws3_wait_conf[:2])
-        print("")
-        print(workstation1.name, " wait time standard deviation: ", std_ws1_wait)
-        print(workstation2.name, " wait time standard deviation: ", std_ws2_wait)
-        print(workstation3.name, " wait time standard deviation: ", std_ws3_wait)
-        print("")
-
-        if debug:
-            for w in [workstation1, workstation2, workstation3]:
-                print("DEBUG: ", w.name, " used:")
-                for c in w.components_used:
-                    print("\t", c, ": ", w.components_used[c])
-            components_inspected = {component1.name: 0, component2.name: 0, component3.name: 0}
-            components_buffered = {component1.name: 0, component2.name: 0, component3.name: 0}
-            components_used = {component1.name: 0, component2.name: 0, component3.name: 0}
-            components_held = {component1.name: 0, component2.name: 0, component3.name: 0}
-            for i in [inspector1, inspector2]:
-                for c in i.components_inspected:
-                    components_inspected[c] += i.components_inspected[c]
-            for w in [workstation1, workstation2, workstation3]:
-                for c in w.buffers.keys():
-                    components_buffered[c.name] += w.buffers[c].level
-                for c in w.components_used:
-                    components_used[c] += w.components_used[c]
-                for c in w.components_held:
-                    components_held[c] += w.components_held[c]
-            component1_conserved = components_inspected[component1.name] == components_buffered[component1.name] \
-                                   + components_used[component1.name]
-            component2_conserved = components_inspected[component2.name] == components_buffered[component2.name] \
-                                   + components_used[component2.name]
-            component3_conserved = components_inspected[component3.name] == components_buffered[component3.name] \
-                                   + components_used[component3.name]
-            print("DEBUG: ", component1.name, " conserved: ", component1_conserved)
-            print("DEBUG: ", component2.name, " conserved: ", component2_conserved)
-            print("DEBUG: ", component3.name, " conserved: ", component3_conserved)
-            print("")
-        print("Workstation 1 Products Made: ", avg_ws1_prods)
-        print("Workstation 1 Products Made Confidence interval: ", ws1_prods_conf[:2])
-        print("Workstation 2 Products Made: ", avg_ws2_prods)
-        print("Workstation 2 Products Made Confidence interval: ", ws2_prods_conf[:2])
-        print("Workstation 3 Products Made: ", avg_ws3_prods)
-        print("Workstation 3 Products Made Confidence interval: ", ws3_prods_conf[:2])
-        print("")
-        print(workstation1.name, " products made time standard deviation: ", std_ws1_prods)
-        print(workstation2.name, " products made time standard deviation: ", std_ws2_prods)
-        print(workstation3.name, " products made time standard deviation: ", std_ws3_prods)
-        print("")
-        print("Workstation 1 Throughput: ", avg_ws1_prods / MAX_MINUTES)
-        print("Workstation 2 Throughput: ", avg_ws2_prods / MAX_MINUTES)
-        print("Workstation 3 Throughput: ", avg_ws3_prods / MAX_MINUTES)
-        print("")
-        print("Workstation 1 Utilization: ", (MAX_MINUTES - avg_ws1_wait) / MAX_MINUTES)
-        print("Workstation 2 Utilization: ", (MAX_MINUTES - avg_ws2_wait) / MAX_MINUTES)
-        print("Workstation 3 Utilization: ", (MAX_MINUTES - avg_ws3_wait) / MAX_MINUTES)
-        print("")
-        print("Workstation 1 Mean service time: ", (MAX_MINUTES - avg_ws1_wait) / avg_ws1_prods)
-        print("Workstation 2 Mean service time: ", (MAX_MINUTES - avg_ws2_wait) / avg_ws2_prods)
-        print("Workstation 3 Mean service time: ", (MAX_MINUTES - avg_ws3_wait) / avg_ws3_prods)
-
-        if plot:
-            plt.plot(workstation1.products_time)
-            plt.title("Products made by Workstation 1 by Minute")
-            plt.xlabel("Minutes")
-            plt.xticks(np.arange(0, MAX_MINUTES + 1, 250))
-            plt.ylabel("Products Made")
-            plt.show()
-            plt.plot(workstation2.products_time)
-            plt.title("Products made by Workstation 2 by Minute")
-            plt.xlabel("Minutes")
-            plt.xticks(np.arange(0, MAX_MINUTES + 1, 250))
-            plt.ylabel("Products Made")
-            plt.show()
-            plt.plot(workstation3.products_time)
-            plt.title("Products made by Workstation 3 by Minute")
-            plt.xlabel("Minutes")
-            plt.xticks(np.arange(0, MAX_MINUTES + 1, 250))
-            plt.ylabel("Products Made")
-            plt.show()
+                data = compare_policies(config, args.runs, args.seed, args.antithetic, args.workers)
+                rows = comparison_rows(data, names)
+
+    write_output(data, rows, args.format, args.output)
+    if args.plot and args.command == "run":
+        plot_products(data)
+    elif args.plot and args.command == "sweep":
+        plot_sensitivity(points, records, names)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
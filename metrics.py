@@ -0,0 +1,211 @@
+from array import array
+
+import numpy as np
+
+METRICS = ("products_time", "counters", "buffer_levels", "utilization")
+DEFAULT_METRICS = {}  # replications only need the running totals, so no metric is kept unless asked for
+
+
+class Null:
+    __slots__ = ()
+
+    def add(self, *args):
+        """
+        Ignores a count, used in place of a metric that is turned off
+        :return: None
+        """
+
+    def update(self, *args):
+        """
+        Ignores a change, used in place of a metric that is turned off
+        :return: None
+        """
+
+    def __bool__(self):
+        return False
+
+
+NULL = Null()
+
+
+class Counters:
+    __slots__ = ("names", "counts")
+
+    def __init__(self, names: list):
+        """
+        Constructor for counters of a fixed set of names, kept in a list and read like a dict
+        :param names: the names counted, e.g. the components of a workstation
+        """
+        self.names = list(names)
+        self.counts = [0] * len(self.names)
+
+    def add(self, index: int, n: int = 1):
+        """
+        Adds to a counter
+        :param index: the position of the name counted
+        :param n: the amount to add
+        :return: None
+        """
+        self.counts[index] += n
+
+    def __getitem__(self, name: str) -> int:
+        return self.counts[self.names.index(name)]
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def items(self):
+        """
+        Returns the names with their counts
+        :return: the name and count pairs
+        """
+        return zip(self.names, self.counts)
+
+
+class TimeWeighted:
+    __slots__ = ("start", "value", "last", "area")
+
+    def __init__(self, start: float = 0, value: float = 0):
+        """
+        Constructor for a time weighted accumulator of a value that changes at points in time, e.g. a buffer level
+        :param start: the time from which the value is accumulated, e.g. the deletion point
+        :param value: the value at time 0
+        """
+        self.start = start
+        self.value = value
+        self.last = 0
+        self.area = 0.0
+
+    def update(self, now: float, value: float):
+        """
+        Records that the value changed
+        :param now: the time of the change
+        :param value: the new value
+        :return: None
+        """
+        if now > self.start:
+            self.area += self.value * (now - max(self.last, self.start))
+        self.last = now
+        self.value = value
+
+    def mean(self, now: float) -> float:
+        """
+        Returns the time weighted mean of the value since the start
+        :param now: the end of the period
+        :return: the mean
+        """
+        if now <= self.start:
+            return self.value
+        return (self.area + self.value * (now - max(self.last, self.start))) / (now - self.start)
+
+
+class Histogram:
+    __slots__ = ("width", "max_buckets", "counts")
+
+    def __init__(self, width: float = 1, max_buckets: int = None):
+        """
+        Constructor for counts of events in time buckets, kept in a growable array
+        :param width: the width of each bucket in minutes
+        :param max_buckets: the most buckets kept, after which neighbouring buckets are merged and the width doubled,
+                            None for no limit
+        """
+        self.width = width
+        self.max_buckets = max_buckets
+        self.counts = array("l")
+
+    def add(self, time: float, n: int = 1):
+        """
+        Counts events at a time
+        :param time: the time of the events
+        :param n: the number of events
+        :return: None
+        """
+        index = int(time / self.width)
+        while self.max_buckets and index >= self.max_buckets:
+            self.coarsen()
+            index = int(time / self.width)
+        if index >= len(self.counts):
+            self.counts.extend([0] * (index + 1 - len(self.counts)))
+        self.counts[index] += n
+
+    def coarsen(self):
+        """
+        Merges neighbouring buckets, doubling the width
+        :return: None
+        """
+        counts = self.counts
+        merged = array("l", (counts[i] + (counts[i + 1] if i + 1 < len(counts) else 0)
+                             for i in range(0, len(counts), 2)))
+        self.counts = merged
+        self.width *= 2
+
+    def to_array(self, length: int = None) -> np.ndarray:
+        """
+        Returns the counts as a NumPy array
+        :param length: the number of buckets, padded with zeros or cut, all of them if None
+        :return: the counts
+        """
+        counts = np.frombuffer(self.counts, dtype=self.counts.typecode) if self.counts else np.zeros(0, dtype=int)
+        if length is None:
+            return counts.copy()
+        result = np.zeros(length, dtype=counts.dtype)
+        result[:min(length, len(counts))] = counts[:length]
+        return result
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __getitem__(self, index):
+        return self.counts[index]
+
+    def __iter__(self):
+        return iter(self.counts)
+
+
+def histogram(metrics: dict, name: str):
+    """
+    Creates a histogram if it is turned on
+    :param metrics: the metrics turned on, with their options
+    :param name: the name of the metric
+    :return: the histogram or NULL
+    """
+    if name not in metrics:
+        return NULL
+    return Histogram(**metrics[name])
+
+
+def counters(metrics: dict, names: list):
+    """
+    Creates counters if they are turned on
+    :param metrics: the metrics turned on, with their options
+    :param names: the names counted
+    :return: the counters or NULL
+    """
+    return Counters(names) if "counters" in metrics else NULL
+
+
+def time_weighted(metrics: dict, name: str, start: float):
+    """
+    Creates a time weighted accumulator if it is turned on
+    :param metrics: the metrics turned on, with their options
+    :param name: the name of the metric
+    :param start: the time from which the value is accumulated
+    :return: the accumulator or NULL
+    """
+    return TimeWeighted(start) if name in metrics else NULL
+
+
+def resolve(metrics: dict, debug: bool) -> dict:
+    """
+    Works out the metrics an entity keeps
+    :param metrics: the metrics turned on, DEFAULT_METRICS if None
+    :param debug: if debug mode is on, which needs the counters
+    :return: the metrics turned on, with their options
+    """
+    metrics = dict(DEFAULT_METRICS if metrics is None else metrics)
+    if debug:
+        metrics.setdefault("counters", {})
+    return metrics
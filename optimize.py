@@ -0,0 +1,223 @@
+import copy
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from analysis import CONFIDENCE, generate_confidence
+from replication import replication_seeds, resolve_deletion_point, run_replication
+from topology import REFERENCE, load_topology
+
+ENUMERATED = 100000  # the most designs listed in full before a limited search draws them at random instead
+
+
+def buffers(spec: dict) -> list:
+    """
+    Lists the buffers of a facility
+    :param spec: the topology
+    :return: the workstation and component of every buffer
+    """
+    products = {p["name"]: p["required_components"] for p in spec["products"]}
+    return [(w["name"], c) for w in spec["workstations"] for c in products[w["product"]]]
+
+
+def allocations(n: int, budget: int, minimum: int = 1, maximum: int = None):
+    """
+    Generates every way of sharing a buffer budget between buffers
+    :param n: the number of buffers
+    :param budget: the total capacity of the buffers
+    :param minimum: the smallest capacity of a buffer
+    :param maximum: the largest capacity of a buffer, no limit if None
+    :return: the capacities of the buffers, one tuple per allocation
+    """
+    if n == 0:
+        if budget == 0:
+            yield ()
+        return
+    top = budget - minimum * (n - 1)
+    if maximum is not None:
+        top = min(top, maximum)
+    for capacity in range(minimum, top + 1):
+        for rest in allocations(n - 1, budget - capacity, minimum, maximum):
+            yield (capacity,) + rest
+
+
+def count_allocations(n: int, budget: int, minimum: int = 1, maximum: int = None) -> list:
+    """
+    Counts the ways of sharing a buffer budget between buffers, for every smaller budget and number of buffers too
+    :param n: the number of buffers
+    :param budget: the total capacity of the buffers
+    :param minimum: the smallest capacity of a buffer
+    :param maximum: the largest capacity of a buffer, no limit if None
+    :return: the number of allocations of each budget b between k buffers, indexed [k][b]
+    """
+    top = budget if maximum is None else maximum
+    counts = [[0] * (budget + 1) for _ in range(n + 1)]
+    counts[0][0] = 1
+    for k in range(1, n + 1):
+        for b in range(budget + 1):
+            counts[k][b] = sum(counts[k - 1][b - c] for c in range(minimum, min(top, b) + 1))
+    return counts
+
+
+def nth_allocation(index: int, n: int, budget: int, minimum: int, counts: list) -> tuple:
+    """
+    Finds an allocation by its position in the order allocations generates them, without generating the others
+    :param index: the position of the allocation
+    :param n: the number of buffers
+    :param budget: the total capacity of the buffers
+    :param minimum: the smallest capacity of a buffer
+    :param counts: count_allocations of the same buffers
+    :return: the capacities of the buffers
+    """
+    capacities = []
+    for k in range(n, 0, -1):
+        capacity = minimum
+        while index >= counts[k - 1][budget - capacity]:
+            index -= counts[k - 1][budget - capacity]
+            capacity += 1
+        capacities.append(capacity)
+        budget -= capacity
+    return tuple(capacities)
+
+
+def design(slots: list, capacities: tuple, policy: str) -> dict:
+    """
+    Builds a design from an allocation
+    :param slots: the workstation and component of every buffer
+    :param capacities: the capacity of every buffer
+    :param policy: the routing policy
+    :return: the design, the capacity of every buffer and the routing policy
+    """
+    capacity = {}
+    for (workstation, component), c in zip(slots, capacities):
+        capacity.setdefault(workstation, {})[component] = c
+    return {"capacity": capacity, "policy": policy}
+
+
+def make_candidates(topology=None, budget: int = None, policies=("first", "last"), minimum: int = 1,
+                    maximum: int = None, limit: int = None, seed=None) -> list:
+    """
+    Builds the designs searched, every allocation of the budget under every routing policy
+    :param topology: a topology dict or file path, the reference facility if None
+    :param budget: the total buffer capacity, that of the topology if None
+    :param policies: the routing policies tried, names from routing.ROUTERS
+    :param minimum: the smallest capacity of a buffer
+    :param maximum: the largest capacity of a buffer, no limit if None
+    :param limit: the most designs kept, drawn at random if there are more, all of them if None. Past ENUMERATED
+                  designs they are drawn directly, so a facility with dozens of buffers can be searched.
+    :param seed: the seed of the draw
+    :return: the designs, each the capacity of every buffer and a routing policy
+    """
+    spec = load_topology(topology if topology is not None else REFERENCE)
+    products = {p["name"]: p["required_components"] for p in spec["products"]}
+    if budget is None:
+        budget = 0
+        for w in spec["workstations"]:
+            capacity = w.get("capacity", 2)
+            budget += sum(capacity.values()) if isinstance(capacity, dict) else capacity * len(products[w["product"]])
+
+    slots = buffers(spec)
+    counts = count_allocations(len(slots), budget, minimum, maximum)
+    total = counts[len(slots)][budget] * len(policies)
+    if not total:
+        raise ValueError("no allocation of %d buffer slots fits %d buffers" % (budget, len(slots)))
+
+    rng = np.random.default_rng(seed)
+    if limit is not None and total > ENUMERATED:
+        # random designs by their position in the full list, drawn with 64 spare bits so the modulo is unbiased
+        size = (total.bit_length() + 71) // 8
+        chosen = set()
+        while len(chosen) < min(limit, total):
+            chosen.add(int.from_bytes(rng.bytes(size), "big") % total)
+        return [design(slots, nth_allocation(i // len(policies), len(slots), budget, minimum, counts),
+                       policies[i % len(policies)]) for i in sorted(chosen)]
+
+    candidates = [design(slots, capacities, policy)
+                  for capacities in allocations(len(slots), budget, minimum, maximum) for policy in policies]
+    if limit is not None and len(candidates) > limit:
+        chosen = rng.choice(len(candidates), limit, replace=False)
+        candidates = [candidates[i] for i in sorted(chosen)]
+    return candidates
+
+
+def candidate_config(config: dict, candidate: dict) -> dict:
+    """
+    Applies a design to the facility config
+    :param config: the facility config
+    :param candidate: the capacity of every buffer and the routing policy
+    :return: the config of the design
+    """
+    spec = copy.deepcopy(load_topology(config["topology"] if config["topology"] is not None else REFERENCE))
+    for w in spec["workstations"]:
+        w["capacity"] = candidate["capacity"][w["name"]]
+    return dict(config, topology=spec, policy=candidate["policy"])
+
+
+def evaluate(configs: list, seeds: list, workers: int = None) -> list:
+    """
+    Runs one replication per config and seed pair on a process pool
+    :param configs: the config of each replication
+    :param seeds: the seed of each replication
+    :param workers: the number of worker processes, 1 to run in this process
+    :return: the throughput of each replication, products per minute after the deletion point over all workstations
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(seeds) == 1:
+        results = list(map(run_replication, configs, seeds))
+    else:
+        chunksize = max(1, len(seeds) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(run_replication, configs, seeds, chunksize=chunksize))
+    return [sum(products_made) / (config["max_minutes"] - config["deletion_point"])
+            for config, (_, _, products_made) in zip(configs, results)]
+
+
+def successive_halving(config: dict = None, candidates: list = None, replications: int = 4, eta: int = 2,
+                       max_replications: int = 64, seed=None, workers: int = None,
+                       confidence: float = CONFIDENCE) -> dict:
+    """
+    Searches buffer capacities and routing policies for the highest throughput.
+    Every design still in the running gets the same replications, the best 1/eta are kept and their replications
+    are multiplied by eta, so the budget goes to the promising designs. The same seeds are used for every design,
+    so they are compared with common random numbers.
+    :param config: the facility config
+    :param candidates: the designs searched, make_candidates() of the facility if None
+    :param replications: the replications of every design in the first round
+    :param eta: the factor the designs are cut by and the replications grow by each round
+    :param max_replications: the most replications of a design
+    :param seed: the seed of the study, None for fresh entropy
+    :param workers: the number of worker processes, 1 to run in this process
+    :param confidence: the confidence level of the intervals
+    :return: the best design, the ranking of the designs with their replications, mean throughput and confidence
+             interval, the rounds and the total number of replications run
+    """
+    config = resolve_deletion_point(config, seed, workers)
+    candidates = candidates or make_candidates(config["topology"])
+    configs = [candidate_config(config, candidate) for candidate in candidates]
+    seeds = replication_seeds(seed, max_replications)
+    throughput = [[] for _ in candidates]
+
+    alive = list(range(len(candidates)))
+    runs = min(replications, max_replications)
+    rounds = []
+    while True:
+        pairs = [(i, s) for i in alive for s in seeds[len(throughput[i]):runs]]
+        for (i, _), value in zip(pairs, evaluate([configs[i] for i, _ in pairs], [s for _, s in pairs], workers)):
+            throughput[i].append(value)
+        rounds.append({"candidates": len(alive), "replications": runs})
+        alive.sort(key=lambda i: -np.mean(throughput[i]))
+        if len(alive) == 1 or runs >= max_replications:
+            break
+        alive = alive[:max(1, math.ceil(len(alive) / eta))]
+        runs = min(runs * eta, max_replications)
+
+    ranking = []
+    for i in sorted(range(len(candidates)), key=lambda i: (-len(throughput[i]), -np.mean(throughput[i]))):
+        ranking.append({"candidate": candidates[i], "replications": len(throughput[i]),
+                        "throughput": float(np.mean(throughput[i])),
+                        "confidence": generate_confidence(throughput[i], confidence)
+                        if len(throughput[i]) > 1 else None})
+    return {"best": candidates[alive[0]], "ranking": ranking, "rounds": rounds,
+            "replications": sum(map(len, throughput))}
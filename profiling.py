@@ -0,0 +1,183 @@
+import heapq
+import json
+import time
+from collections import Counter, defaultdict
+
+import simpy
+
+import engine
+from replication import make_config, setup
+
+SAMPLE_EVERY = 100  # events between samples of the event queue size
+
+
+class ProfiledEnvironment(simpy.Environment):
+
+    def __init__(self):
+        """
+        Constructor for a simpy.Environment that counts the events it processes by type, times its step loop,
+        samples the size of its event queue and wraps every process it starts to time it
+        """
+        super().__init__()
+        self.steps = 0
+        self.events = Counter()
+        self.step_seconds = 0.0
+        self.queue_sizes = []  # simulation time and number of scheduled events, every SAMPLE_EVERY events
+        self.processes = defaultdict(lambda: {"resumes": 0, "seconds": 0.0, "waiting": Counter()})
+
+    def step(self):
+        """
+        Processes the next event, counting and timing it
+        :return: None
+        """
+        event = self._queue[0][3] if self._queue else None
+        if self.steps % SAMPLE_EVERY == 0:
+            self.queue_sizes.append((self._now, len(self._queue)))
+        self.steps += 1
+        start = time.perf_counter()
+        try:
+            super().step()
+        finally:
+            self.step_seconds += time.perf_counter() - start
+            self.events[type(event).__name__] += 1
+
+    def process(self, generator):
+        """
+        Starts a process wrapped so it is timed, named after the entity running it and its generator function
+        :param generator: the process
+        :return: the simpy.Process
+        """
+        owner = generator.gi_frame.f_locals.get("self") if generator.gi_frame else None
+        name = "%s;%s" % (getattr(owner, "name", type(owner).__name__), generator.__name__)
+        return super().process(self.profiled(generator, self.processes[name]))
+
+    def profiled(self, generator, stats: dict):
+        """
+        Runs a process, timing the Python code between its yields and adding up the simulation time it spends
+        waiting on each type of event, e.g. Timeout or ContainerGet
+        :param generator: the process
+        :param stats: the statistics of the process
+        :return: the value the process returns
+        """
+        value, error = None, None
+        while True:
+            start = time.perf_counter()
+            try:
+                event = generator.send(value) if error is None else generator.throw(error)
+            except StopIteration as stop:
+                stats["seconds"] += time.perf_counter() - start
+                return stop.value
+            stats["seconds"] += time.perf_counter() - start
+            stats["resumes"] += 1
+
+            waiting_since = self._now
+            value, error = None, None
+            try:
+                value = yield event
+            except BaseException as thrown:  # e.g. an interrupt, handed on to the process
+                error = thrown
+            stats["waiting"][type(event).__name__] += self._now - waiting_since
+
+
+class ProfiledEventEngine(engine.EventEngine):
+
+    def __init__(self):
+        """
+        Constructor for a heapq based event engine that counts and times its callbacks and samples the size of its
+        event queue
+        """
+        super().__init__()
+        self.steps = 0
+        self.events = Counter()
+        self.step_seconds = 0.0
+        self.queue_sizes = []
+        self.processes = defaultdict(lambda: {"resumes": 0, "seconds": 0.0, "waiting": Counter()})
+
+    def run(self, until: float):
+        """
+        Runs the events scheduled before a time, counting and timing each callback
+        :param until: the time to stop at
+        :return: None
+        """
+        queue, processes = self.queue, self.processes
+        loop_start = time.perf_counter()
+        while queue and queue[0][0] < until:
+            if self.steps % SAMPLE_EVERY == 0:
+                self.queue_sizes.append((self.now, len(queue)))
+            self.steps += 1
+            self.now, _, callback = heapq.heappop(queue)
+            name = "%s;%s" % (getattr(callback.__self__, "name", type(callback.__self__).__name__),
+                              callback.__name__)
+            start = time.perf_counter()
+            callback()
+            processes[name]["seconds"] += time.perf_counter() - start
+            processes[name]["resumes"] += 1
+            self.events[callback.__name__] += 1
+        self.step_seconds += time.perf_counter() - loop_start
+        self.now = until
+
+
+PROFILED = {"simpy": ProfiledEnvironment, "heap": ProfiledEventEngine}
+
+
+def report(env, wall_seconds: float) -> dict:
+    """
+    Summarizes the profile of a run
+    :param env: the profiled environment after the run
+    :param wall_seconds: the wall time of the run
+    :return: the wall time, the time in the step loop, the time in the scheduler outside the processes, the events
+             by type, the queue size samples, and the resumes, wall time and simulation time spent waiting on each
+             type of event of every process
+    """
+    processes = {name: {"resumes": stats["resumes"], "seconds": stats["seconds"], "waiting": dict(stats["waiting"])}
+                 for name, stats in sorted(env.processes.items())}
+    inside = sum(stats["seconds"] for stats in processes.values())
+    return {"wall_seconds": wall_seconds, "step_seconds": env.step_seconds,
+            "scheduler_seconds": env.step_seconds - inside, "events": dict(env.events),
+            "queue_sizes": env.queue_sizes, "processes": processes}
+
+
+def collapsed_stacks(profile: dict) -> list:
+    """
+    Converts a profile to the collapsed stack format read by flamegraph tools, with microseconds as counts
+    :param profile: the output of report
+    :return: the stack lines
+    """
+    lines = ["run;scheduler %d" % round(profile["scheduler_seconds"] * 1e6)]
+    for name, stats in profile["processes"].items():
+        lines.append("run;%s %d" % (name, round(stats["seconds"] * 1e6)))
+    return lines
+
+
+def profile_replication(config: dict = None, seed: int = 0, path: str = None) -> dict:
+    """
+    Runs one replication with the profiling hooks on
+    :param config: the facility config
+    :param seed: the seed of the replication
+    :param path: where the report (path.json) and the flamegraph stacks (path.folded) are written, None to not
+                 write them
+    :return: the profile
+    """
+    config = make_config(dict(config or {}, profile=True))
+    env, _, _ = setup(config, seed)
+    start = time.perf_counter()
+    env.run(until=config["max_minutes"])
+    profile = report(env, time.perf_counter() - start)
+    if path:
+        with open(path + ".json", "w") as f:
+            json.dump(profile, f, indent=1)
+        with open(path + ".folded", "w") as f:
+            f.write("\n".join(collapsed_stacks(profile)) + "\n")
+    return profile
+
+
+if __name__ == "__main__":
+    import sys
+
+    result = profile_replication({"engine": sys.argv[1] if len(sys.argv) > 1 else "simpy"})
+    print("wall %.4fs, step loop %.4fs, scheduler %.4fs" % (result["wall_seconds"], result["step_seconds"],
+                                                            result["scheduler_seconds"]))
+    print("events:", result["events"])
+    for process, process_stats in result["processes"].items():
+        print("%-40s %6d resumes %.4fs  waiting %s" % (process, process_stats["resumes"], process_stats["seconds"],
+                                                      process_stats["waiting"]))
@@ -0,0 +1,176 @@
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+import simpy
+
+import engine
+from classes import Workstation, Inspector
+from inputs import MEANS
+from samplers import AntitheticRandom, make_samplers
+from topology import compile_topology
+from tracing import Tracer
+
+MAX_MINUTES = 3300
+DELETION_POINT = 300
+DEFAULT_CONFIG = {"means": MEANS, "default": False, "max_minutes": MAX_MINUTES, "deletion_point": DELETION_POINT,
+                  "alternate": True, "debug": False, "sampling": "shuffle", "engine": "simpy",
+                  "antithetic": False, "metrics": None,
+                  "topology": None, "policy": None, "trace": None, "trace_format": "npy",
+                  "profile": False}
+PILOT_TAG = 0x70696C6F  # added to the seed of a study to give its deletion point pilots their own stream
+ENGINES = {"simpy": (simpy.Environment, Workstation, Inspector),
+           "heap": (engine.EventEngine, engine.Workstation, engine.Inspector)}
+
+
+def make_config(config: dict = None) -> dict:
+    """
+    Fills in any missing facility settings with the defaults
+    :param config: the settings to override
+    :return: a complete facility config
+    """
+    resolved = dict(DEFAULT_CONFIG)
+    if config:
+        resolved.update(config)
+    return resolved
+
+
+def resolve_deletion_point(config: dict, seed=None, workers: int = None) -> dict:
+    """
+    Picks the deletion point from short pilot runs if the config asks for it with "auto"
+    :param config: the facility config
+    :param seed: the seed of the study, or its replication seeds, None for fresh entropy. The pilots get a stream
+                 of their own, so the deletion point is not picked from the runs it is then applied to.
+    :param workers: the number of worker processes, 1 to run in this process
+    :return: the config with a deletion point in minutes
+    """
+    config = make_config(config)
+    if config["deletion_point"] == "auto":
+        from warmup import detect_deletion_point  # warmup runs its pilots through this module
+
+        pilot = None if seed is None else [int(s) for s in np.atleast_1d(seed)] + [PILOT_TAG]
+        config["deletion_point"] = detect_deletion_point(config, seed=pilot, workers=workers)
+    return config
+
+
+def replication_seeds(seed, runs: int) -> list:
+    """
+    Derives an independent seed for every replication
+    :param seed: the seed of the study, None for fresh entropy
+    :param runs: the number of replications
+    :return: one integer seed per replication
+    """
+    return [int(child.generate_state(1)[0]) for child in np.random.SeedSequence(seed).spawn(runs)]
+
+
+def setup(config: dict, seed: int) -> tuple:
+    """
+    Builds a replication of the facility without running it
+    :param config: the facility config
+    :param seed: the seed of the replication
+    :return: the environment, the inspectors and the workstations
+    """
+    config = resolve_deletion_point(config, seed)
+    model = compile_topology(config["topology"])
+    random.seed(seed)
+    np.random.seed(seed)
+    # one stream per service time stream and inspector
+    streams = np.random.SeedSequence(seed).spawn(len(model.streams) + len(model.inspectors))
+    times = make_samplers(model.means(config["means"]), config["default"], config["sampling"],
+                          streams[:len(model.streams)], config["antithetic"], model.data_files)
+    chooser = AntitheticRandom if config["antithetic"] else random.Random
+    rngs = [chooser(int(s.generate_state(1)[0])) for s in streams[len(model.streams):]]
+
+    tracer = None
+    if config["trace"]:  # one directory of trace files per replication
+        tracer = Tracer(os.path.join(config["trace"], "run-%d" % seed),
+                        dict(model.layout(), seed=seed, deletion_point=config["deletion_point"]),
+                        fmt=config["trace_format"])
+
+    environment, workstation, inspector = ENGINES[config["engine"]]
+    if config["profile"]:
+        from profiling import PROFILED  # the profiling hooks are only loaded when asked for
+        environment = PROFILED[config["engine"]]
+    env = environment()
+    inspectors, workstations = model.instantiate(env, times, config["debug"], config["deletion_point"],
+                                                 config["alternate"], rngs, workstation, inspector,
+                                                 config["metrics"], config["policy"], tracer)
+    return env, inspectors, workstations
+
+
+def close_trace(env, inspectors: list, workstations: list):
+    """
+    Closes the trace of a replication, if it is traced, recording the final level of every buffer
+    :param env: the environment of the replication
+    :param inspectors: the inspectors
+    :param workstations: the workstations, whose buffers are in the order of the trace description
+    :return: None
+    """
+    if inspectors[0].tracer is not None:
+        inspectors[0].tracer.close(env.now, [buffer.level for w in workstations for buffer in w.buffers.values()])
+
+
+def simulate(config: dict, seed: int) -> tuple:
+    """
+    Runs a single replication of the facility
+    :param config: the facility config
+    :param seed: the seed of the replication
+    :return: the inspectors and the workstations after the run
+    """
+    config = make_config(config)
+    env, inspectors, workstations = setup(config, seed)
+    env.run(until=config["max_minutes"])
+    close_trace(env, inspectors, workstations)
+    return inspectors, workstations
+
+
+def run_replication(config: dict, seed: int) -> tuple:
+    """
+    Runs a single replication and keeps only its metrics
+    :param config: the facility config
+    :param seed: the seed of the replication
+    :return: the blocked times, wait times and products made of the run
+    """
+    inspectors, workstations = simulate(config, seed)
+    return ([i.blocked_time for i in inspectors], [w.wait_time for w in workstations],
+            [w.products_made for w in workstations])
+
+
+def run_seeds(config: dict, seeds: list, workers: int = None) -> dict:
+    """
+    Runs one replication of the facility per seed on a process pool
+    :param config: the facility config
+    :param seeds: the seeds of the replications
+    :param workers: the number of worker processes, 1 to run in this process
+    :return: per run metric arrays, one column per inspector or workstation, and the seeds used
+    """
+    config = resolve_deletion_point(config, list(seeds), workers)  # once for all runs, so they share it
+    runs = len(seeds)
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1 or runs == 1:
+        results = list(map(run_replication, repeat(config), seeds))
+    else:
+        chunksize = max(1, runs // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(run_replication, repeat(config), seeds, chunksize=chunksize))
+
+    blocked_time, wait_time, products_made = zip(*results)
+    return {"blocked_time": np.array(blocked_time, dtype=float),
+            "wait_time": np.array(wait_time, dtype=float),
+            "products_made": np.array(products_made, dtype=int),
+            "seeds": list(seeds)}
+
+
+def run_replications(config: dict, runs: int, seed=None, workers: int = None) -> dict:
+    """
+    Runs independent replications of the facility on a process pool
+    :param config: the facility config
+    :param runs: the number of replications
+    :param seed: the seed of the study, None for fresh entropy
+    :param workers: the number of worker processes, 1 to run in this process
+    :return: per run metric arrays, one column per inspector or workstation, and the seeds used
+    """
+    return run_seeds(config, replication_seeds(seed, runs), workers)
@@ -0,0 +1,230 @@
+import heapq
+from abc import ABC, abstractmethod
+
+import simpy
+
+
+class Container(simpy.Container):
+
+    def __init__(self, env: simpy.Environment, capacity: int):
+        """
+        Constructor for a simpy.Container that tells the routers watching it when its level changes
+        :param env: the environment the buffer will be in
+        :param capacity: the most components the buffer can hold
+        """
+        super().__init__(env, capacity)
+        self.watchers = []  # the routers and the position of the buffer in each of them
+
+    def _do_put(self, event):
+        level = self._level
+        result = super()._do_put(event)
+        if self._level != level:
+            for router, position in self.watchers:
+                router.moved(position, self._level)
+        return result
+
+    def _do_get(self, event):
+        level = self._level
+        result = super()._do_get(event)
+        if self._level != level:
+            for router, position in self.watchers:
+                router.moved(position, self._level)
+        return result
+
+
+class Router(ABC):
+
+    def __init__(self, buffers: list, weights: list = None):
+        """
+        Constructor for a router, which picks the buffer a component is sent to among the buffers that take it.
+        Every buffer is watched, so the router's index is updated on each put and get instead of the buffers
+        being scanned on each send.
+        :param buffers: the candidate buffers, in tie-break order, each with a level and a watchers list
+        :param weights: the mean service time of the workstation of each buffer
+        """
+        if not buffers:
+            raise ValueError("a router needs at least one buffer")
+        self.buffers = buffers
+        self.weights = weights or [1.0] * len(buffers)
+        self.levels = [buffer.level for buffer in buffers]
+        for position, buffer in enumerate(buffers):
+            buffer.watchers.append((self, position))
+
+    def moved(self, position: int, level: int):
+        """
+        Records the new level of a buffer
+        :param position: the position of the buffer among the candidates
+        :param level: the new level
+        :return: None
+        """
+        self.levels[position] = level
+
+    @abstractmethod
+    def choose(self) -> int:
+        """
+        Picks the buffer the next component is sent to
+        :return: the position of the buffer among the candidates
+        """
+
+
+class LevelRouter(Router):
+
+    def __init__(self, buffers: list, weights: list = None):
+        """
+        Constructor for a router that sends to a buffer with the fewest components among those with space, or
+        among all of them if every buffer is full.
+        The buffers are kept in buckets by level, each bucket a bitmask of buffer positions, so a put or get
+        moves one bit and the fewest components are found from the lowest bucket that is not empty. The full
+        buffers are kept in a bitmask as well, which only matters when the capacities differ.
+        :param buffers: the candidate buffers, in tie-break order, each with a level and a watchers list
+        :param weights: unused
+        """
+        super().__init__(buffers, weights)
+        self.capacities = [buffer.capacity for buffer in buffers]
+        self.masks = [0] * (max(self.capacities) + 1)
+        self.full = 0
+        for position, level in enumerate(self.levels):
+            self.masks[level] |= 1 << position
+            if level >= self.capacities[position]:
+                self.full |= 1 << position
+        self.everyone = (1 << len(buffers)) - 1
+        self.low = min(self.levels)  # no buffer has fewer components, the bucket may be empty
+
+    def moved(self, position: int, level: int):
+        bit = 1 << position
+        self.masks[self.levels[position]] ^= bit
+        self.masks[level] |= bit
+        self.levels[position] = level
+        if level >= self.capacities[position]:
+            self.full |= bit
+        else:
+            self.full &= ~bit
+        if level < self.low:
+            self.low = level
+
+    def choose(self) -> int:
+        masks = self.masks
+        while not masks[self.low]:
+            self.low += 1
+        if self.full != self.everyone:  # the lowest bucket holding a buffer with space
+            level, room = self.low, masks[self.low] & ~self.full
+            while not room:
+                level += 1
+                room = masks[level] & ~self.full
+            return self.pick(room)
+        return self.pick(masks[self.low])
+
+    @abstractmethod
+    def pick(self, mask: int) -> int:
+        """
+        Breaks a tie between the buffers with the fewest components
+        :param mask: the positions of the buffers with the fewest components
+        :return: the position of the buffer chosen
+        """
+
+
+class FirstRouter(LevelRouter):
+
+    def pick(self, mask: int) -> int:
+        """
+        Sends to the first buffer with the fewest components, the standard design
+        :param mask: the positions of the buffers with the fewest components
+        :return: the position of the buffer chosen
+        """
+        return (mask & -mask).bit_length() - 1
+
+
+class LastRouter(LevelRouter):
+
+    def pick(self, mask: int) -> int:
+        """
+        Sends to the last buffer with the fewest components, the alternate design
+        :param mask: the positions of the buffers with the fewest components
+        :return: the position of the buffer chosen
+        """
+        return mask.bit_length() - 1
+
+
+class ShortestWaitRouter(Router):
+
+    def __init__(self, buffers: list, weights: list = None):
+        """
+        Constructor for a router that sends to the buffer with the shortest expected wait before the component
+        is used, taken as the components ahead of it and itself times the mean service time of the workstation.
+        The waits are kept in a heap, outdated entries are dropped when they reach the top and the heap is rebuilt
+        once they pile up.
+        :param buffers: the candidate buffers, in tie-break order, each with a level and a watchers list
+        :param weights: the mean service time of the workstation of each buffer
+        """
+        super().__init__(buffers, weights)
+        self.waits = [(level + 1) * weight for level, weight in zip(self.levels, self.weights)]
+        self.rebuild()
+
+    def rebuild(self):
+        """
+        Rebuilds the heap from the current waits, ties going to the first buffer
+        :return: None
+        """
+        self.heap = [(wait, position) for position, wait in enumerate(self.waits)]
+        heapq.heapify(self.heap)
+
+    def moved(self, position: int, level: int):
+        self.levels[position] = level
+        wait = (level + 1) * self.weights[position]
+        self.waits[position] = wait
+        heapq.heappush(self.heap, (wait, position))
+        if len(self.heap) > 4 * len(self.waits):
+            self.rebuild()
+
+    def choose(self) -> int:
+        heap, waits = self.heap, self.waits
+        while waits[heap[0][1]] != heap[0][0]:
+            heapq.heappop(heap)
+        return heap[0][1]
+
+
+class RoundRobinRouter(Router):
+
+    def __init__(self, buffers: list, weights: list = None):
+        """
+        Constructor for a router that takes turns between the buffers, skipping full ones
+        :param buffers: the candidate buffers, in tie-break order, each with a level and a watchers list
+        :param weights: unused
+        """
+        super().__init__(buffers, weights)
+        self.capacities = [buffer.capacity for buffer in buffers]
+        self.turn = 0
+
+    def choose(self) -> int:
+        n = len(self.levels)
+        position = self.turn
+        for _ in range(n):  # the next buffer in turn with space, or the next in turn if all are full
+            if self.levels[position] < self.capacities[position]:
+                break
+            position = (position + 1) % n
+        else:
+            position = self.turn
+        self.turn = (position + 1) % n
+        return position
+
+
+ROUTERS = {"first": FirstRouter, "last": LastRouter, "shortest_wait": ShortestWaitRouter,
+           "round_robin": RoundRobinRouter}
+
+
+def route(workstations: list, components: list, policy: str) -> dict:
+    """
+    Builds the routing index of an inspector once, instead of testing each workstation on every send
+    :param workstations: the workstations the inspector can send components to, in tie-break order
+    :param components: the components the inspector inspects
+    :param policy: one of ROUTERS
+    :return: the candidate workstations and the router of each component
+    """
+    if policy not in ROUTERS:
+        raise ValueError("unknown routing policy: %s" % policy)
+    routes = {}
+    for component in components:
+        candidates = [w for w in workstations if component in w.buffers]
+        weights = [getattr(w.processing_times, "mean", 1.0) for w in candidates]
+        routes[component] = candidates, ROUTERS[policy]([w.buffers[component] for w in candidates], weights)
+    return routes
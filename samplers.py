@@ -0,0 +1,221 @@
+import random
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from inputs import DATA_FILES, dat_parser, data_path, generate_inputs
+
+BLOCK = 1024
+SAMPLING = ("shuffle", "bootstrap", "exponential", "fitted")
+
+
+def uniforms(rng: np.random.Generator, size: int, antithetic: bool = False) -> np.ndarray:
+    """
+    Generates uniform variates strictly between 0 and 1 on a grid that is symmetric about 1/2,
+    so the antithetic variate 1 - u is exact and never 0
+    :param rng: the random generator of the stream
+    :param size: the number of variates
+    :param antithetic: if 1 - u should be returned instead of u
+    :return: the variates
+    """
+    u = (2 * rng.integers(0, 2 ** 52, size) + 1) / 2.0 ** 53
+    return 1 - u if antithetic else u
+
+
+def sorted_pool(values) -> np.ndarray:
+    """
+    Sorts service times, without copying them if they are already sorted, e.g. a memory-mapped .dat cache
+    :param values: the service times
+    :return: the sorted times
+    """
+    values = np.asarray(values, dtype=float)
+    if (values[1:] < values[:-1]).any():
+        return np.sort(values)
+    return values
+
+
+class Sampler(ABC):
+
+    def __init__(self, rng: np.random.Generator = None, antithetic: bool = False):
+        """
+        Constructor for a sampler, which hands out service times from a buffer that is refilled a block at a time
+        :param rng: the random generator of the stream
+        :param antithetic: if the sampler should give the antithetic times of the same stream
+        """
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.antithetic = antithetic
+        self.buffer = []
+        self.cursor = 0
+
+    @abstractmethod
+    def refill(self) -> list:
+        """
+        Generates the next block of service times
+        :return: the block
+        """
+
+    def draw(self) -> float:
+        """
+        Returns the next service time
+        :return: a service time
+        """
+        if self.cursor == len(self.buffer):
+            self.buffer = self.refill()
+            self.cursor = 0
+        value = self.buffer[self.cursor]
+        self.cursor += 1
+        return value
+
+
+class ShuffledSampler(Sampler):
+
+    def __init__(self, times: list, rng: np.random.Generator = None, antithetic: bool = False, block: int = BLOCK):
+        """
+        Constructor for a sampler that draws without replacement from a fixed pool.
+        The pool is reshuffled once it has been used up instead of running out. Only the shuffled order is kept,
+        so a large memory-mapped pool is read a block at a time instead of copied.
+        :param times: the pool of service times
+        :param rng: the random generator of the stream
+        :param antithetic: if each time should be swapped for the one of opposite rank in the pool
+        :param block: the number of times handed out at once
+        """
+        super().__init__(rng, antithetic)
+        self.times = sorted_pool(times)
+        self.mean = float(self.times.mean())
+        self.block = block
+        self.ranks = np.zeros(0, dtype=np.int64)  # the order of the current pass through the pool
+        self.position = 0
+
+    def refill(self) -> list:
+        """
+        Hands out the next block of the current pass through the pool, shuffling the pool for a new pass once it
+        has been used up
+        :return: the block
+        """
+        if self.position == len(self.ranks):
+            self.ranks = self.rng.permutation(len(self.times))
+            if self.antithetic:
+                np.subtract(len(self.times) - 1, self.ranks, out=self.ranks)
+            self.position = 0
+        ranks = self.ranks[self.position:self.position + self.block]
+        self.position += len(ranks)
+        return self.times[ranks].tolist()
+
+
+class BootstrapSampler(Sampler):
+
+    def __init__(self, data: list, rng: np.random.Generator = None, block: int = BLOCK, antithetic: bool = False):
+        """
+        Constructor for a sampler that draws with replacement from empirical data
+        :param data: the observed service times
+        :param rng: the random generator of the stream
+        :param block: the number of times generated at once
+        :param antithetic: if the sampler should give the antithetic times of the same stream
+        """
+        super().__init__(rng, antithetic)
+        self.data = sorted_pool(data)
+        self.mean = float(self.data.mean())
+        self.block = block
+
+    def refill(self) -> list:
+        """
+        Resamples a block from the data, indexing the sorted data by uniforms
+        :return: the block
+        """
+        return self.data[(uniforms(self.rng, self.block, self.antithetic) * len(self.data)).astype(int)].tolist()
+
+
+class ExponentialSampler(Sampler):
+
+    def __init__(self, mean: float, rng: np.random.Generator = None, block: int = BLOCK, antithetic: bool = False):
+        """
+        Constructor for a sampler that streams exponential service times
+        :param mean: mean of the distribution
+        :param rng: the random generator of the stream
+        :param block: the number of times generated at once
+        :param antithetic: if the sampler should give the antithetic times of the same stream
+        """
+        super().__init__(rng, antithetic)
+        self.mean = mean
+        self.block = block
+
+    def refill(self) -> list:
+        """
+        Generates a block of exponential variates by inversion
+        :return: the block
+        """
+        return (-self.mean * np.log(uniforms(self.rng, self.block, self.antithetic))).tolist()
+
+
+class FittedSampler(Sampler):
+
+    def __init__(self, distribution, rng: np.random.Generator = None, block: int = BLOCK, antithetic: bool = False):
+        """
+        Constructor for a sampler that streams service times from a distribution fitted to the data
+        :param distribution: the frozen scipy.stats distribution
+        :param rng: the random generator of the stream
+        :param block: the number of times generated at once
+        :param antithetic: if the sampler should give the antithetic times of the same stream
+        """
+        super().__init__(rng, antithetic)
+        self.distribution = distribution
+        self.mean = float(distribution.mean())
+        self.block = block
+
+    def refill(self) -> list:
+        """
+        Generates a block of variates by inversion
+        :return: the block
+        """
+        return self.distribution.ppf(uniforms(self.rng, self.block, self.antithetic)).tolist()
+
+
+class AntitheticRandom(random.Random):
+
+    def random(self) -> float:
+        """
+        Returns 1 - u for the u the stream would have given, kept below 1 so it can index a list
+        :return: a uniform variate
+        """
+        u = super().random()
+        return 1.0 - u if u else 0.0
+
+
+def as_sampler(times) -> Sampler:
+    """
+    Wraps a plain list of processing times so it is drawn from like before, without replacement
+    :param times: a sampler or a list of processing times
+    :return: a sampler
+    """
+    if hasattr(times, "draw"):
+        return times
+    return ShuffledSampler(times, np.random.default_rng(random.getrandbits(64)))
+
+
+def make_samplers(means: dict, default: bool, sampling: str, seeds: list, antithetic: bool = False,
+                  data_files: dict = None) -> dict:
+    """
+    Creates a sampler with its own random stream for every inspector and workstation stream
+    :param means: mean of each stream, keyed like MEANS
+    :param default: if the .dat files should be used as the shuffled pools
+    :param sampling: one of SAMPLING, fitted drawing from the best distribution fitted to each .dat file
+    :param seeds: one seed or SeedSequence per stream, in the order of means
+    :param antithetic: if the samplers should give the antithetic times of their streams
+    :param data_files: the .dat file of each stream, relative to DATA_DIR, DATA_FILES if None
+    :return: the samplers keyed like means
+    """
+    data_files = data_files or DATA_FILES
+    rngs = dict(zip(means, map(np.random.default_rng, seeds)))
+    if sampling == "shuffle":
+        times = generate_inputs(means, default, data_files)
+        return {key: ShuffledSampler(times[key], rngs[key], antithetic) for key in means}
+    if sampling == "bootstrap":
+        return {key: BootstrapSampler(dat_parser(data_path(data_files, key, "bootstrap sampling"), sort=True),
+                                      rngs[key], antithetic=antithetic) for key in means}
+    if sampling == "exponential":
+        return {key: ExponentialSampler(means[key], rngs[key], antithetic=antithetic) for key in means}
+    if sampling == "fitted":
+        from fitting import best_fit  # scipy is only needed for fitted times
+        return {key: FittedSampler(best_fit(data_path(data_files, key, "fitted sampling")), rngs[key],
+                                   antithetic=antithetic) for key in means}
+    raise ValueError("unknown sampling mode: %s" % sampling)
@@ -0,0 +1,68 @@
+import numpy as np
+
+from analysis import CONFIDENCE, RunningStats
+from replication import resolve_deletion_point, run_seeds
+
+METRICS = ("blocked_time", "wait_time", "products_made")
+
+
+def target_met(stats: RunningStats, target: tuple, confidence: float = CONFIDENCE) -> np.ndarray:
+    """
+    Checks the precision of a metric against its target
+    :param stats: the running statistics of the metric
+    :param target: ("relative", fraction of the mean) or ("absolute", half width)
+    :param confidence: the confidence level of the interval
+    :return: if each column meets the target
+    """
+    kind, value = target
+    half_width = stats.half_width(confidence)
+    if kind == "relative":
+        return half_width <= value * np.abs(stats.mean)
+    if kind == "absolute":
+        return half_width <= value
+    raise ValueError("unknown precision target: %s" % kind)
+
+
+def run_until_precise(config: dict, targets: dict, batch: int = 10, min_runs: int = 10, max_runs: int = 1000,
+                      seed=None, workers: int = None, confidence: float = CONFIDENCE) -> dict:
+    """
+    Runs replications in batches until the confidence interval of every target metric is narrow enough
+    :param config: the facility config
+    :param targets: precision target of each metric, e.g. {"products_made": ("relative", 0.01)}
+    :param batch: the number of replications run at a time
+    :param min_runs: the fewest replications run before checking the targets
+    :param max_runs: the most replications run, even if the targets are not met
+    :param seed: the seed of the study, None for fresh entropy
+    :param workers: the number of worker processes, 1 to run in this process
+    :param confidence: the confidence level of the intervals
+    :return: the number of runs, the mean, confidence interval and half width of every metric, the number of runs
+             each target metric needed (-1 where it was not met) and if all targets were met
+    """
+    config = resolve_deletion_point(config, seed, workers)  # once, so every batch uses the same one
+    sequence = np.random.SeedSequence(seed)
+    stats = {metric: RunningStats() for metric in METRICS}
+    needed = {}
+    runs = 0
+    met = False
+
+    while runs < max_runs and not met:
+        size = min(max(batch, min_runs - runs), max_runs - runs)
+        results = run_seeds(config, [int(child.generate_state(1)[0]) for child in sequence.spawn(size)], workers)
+        runs += size
+        for metric in METRICS:
+            stats[metric].update(results[metric])
+        if runs < max(min_runs, 2):
+            continue
+
+        met = True
+        for metric, target in targets.items():
+            ok = target_met(stats[metric], target, confidence)
+            previous = needed.get(metric, np.full(ok.shape, -1))
+            needed[metric] = np.where(ok, np.where(previous >= 0, previous, runs), -1)  # runs since it has held
+            met = met and bool(ok.all())
+
+    return {"runs": runs, "converged": met,
+            "mean": {metric: stats[metric].mean for metric in METRICS},
+            "confidence": {metric: stats[metric].confidence(confidence) for metric in METRICS},
+            "half_width": {metric: stats[metric].half_width(confidence) for metric in METRICS},
+            "runs_needed": needed}
@@ -0,0 +1,151 @@
+import json
+
+import numpy as np
+from scipy import linalg, stats
+
+from analysis import CONFIDENCE
+from replication import resolve_deletion_point
+from sweep import fingerprint, load_results, run_sweep
+
+LENGTHS = (0.1, 0.3, 1.0, 3.0)  # kernel length scales tried, in log mean units
+NUGGETS = (1e-3, 1e-2, 1e-1)  # noise variances tried for points without a confidence interval, in output units
+JITTER = 1e-8
+
+
+def fit_column(x: np.ndarray, y: np.ndarray, noise: np.ndarray) -> dict:
+    """
+    Fits a Gaussian process to one output, choosing the length scale and nugget by marginal likelihood
+    :param x: the inputs, one row per point
+    :param y: the output at each point
+    :param noise: the variance of each output from its confidence interval, NaN where it is not known
+    :return: the fitted model
+    """
+    center, scale = y.mean(), y.std() or 1.0
+    z = (y - center) / scale
+    known = noise / scale ** 2
+    distances = ((x[:, None, :] - x[None, :, :]) ** 2).sum(axis=2)
+
+    best = None
+    for length in LENGTHS:
+        kernel = np.exp(-distances / (2 * length ** 2))
+        for nugget in (NUGGETS if np.isnan(known).any() else NUGGETS[:1]):
+            factor = linalg.cho_factor(kernel + np.diag(np.where(np.isnan(known), nugget, known) + JITTER),
+                                       lower=True)
+            alpha = linalg.cho_solve(factor, z)
+            likelihood = -0.5 * z @ alpha - np.log(np.diag(factor[0])).sum()
+            if best is None or likelihood > best["likelihood"]:
+                best = {"likelihood": likelihood, "length": length, "factor": factor, "alpha": alpha}
+    return dict(best, center=center, scale=scale)
+
+
+class Surrogate:
+
+    def __init__(self, path: str, config: dict = None, replications: int = 10, tolerance: float = 0.02,
+                 metrics: list = None, seed=None, min_points: int = 10, confidence: float = CONFIDENCE):
+        """
+        Constructor for a surrogate of the simulation over the stream means, which answers a query from a
+        Gaussian process fitted to the simulated points when it is precise enough, and simulates the point otherwise.
+        Every simulated point is kept in a results store in the format of sweep.run_sweep, so a sensitivity sweep's
+        store can be used as it is. Only the points simulated with the same settings and number of replications are
+        used.
+        :param path: the results store
+        :param config: the facility config, whose means are the base point
+        :param replications: the number of replications of a simulated point
+        :param tolerance: the largest confidence interval half width of an answer, relative to the size of the
+                          metric
+        :param metrics: the metrics an answer must be precise in, e.g. ["ws_throughput"], all of them if None
+        :param seed: the seed of the simulated points, None for fresh entropy
+        :param min_points: the fewest simulated points before the metamodel is used
+        :param confidence: the confidence level of the intervals
+        """
+        self.path = path
+        self.config = resolve_deletion_point(config, seed)
+        self.base = dict(self.config["means"])
+        self.replications = replications
+        self.tolerance = tolerance
+        self.metrics = metrics
+        self.seed = seed
+        self.min_points = min_points
+        self.confidence = confidence
+        self.records = load_results(path, self.usable)
+        self.models = None
+
+    def usable(self, record: dict) -> bool:
+        """
+        Tells if a stored point was simulated with the settings and number of replications of the surrogate
+        :param record: the stored point
+        :return: if the point can be used
+        """
+        return record.get("fingerprint") == fingerprint(dict(self.config, means=record["means"]), self.replications)
+
+    def inputs(self, means: dict) -> np.ndarray:
+        """
+        Converts means to metamodel inputs, the log of each mean relative to the base point
+        :param means: the means, missing ones taken from the base point
+        :return: the inputs
+        """
+        return np.log([means.get(key, value) / value for key, value in self.base.items()])
+
+    def fit(self):
+        """
+        Fits a Gaussian process to every metric column of the simulated points
+        :return: None
+        """
+        records = list(self.records.values())
+        x = np.array([self.inputs(r["means"]) for r in records])
+        self.models = {}
+        for metric in records[0]["mean"]:
+            y = np.array([r["mean"][metric] for r in records], dtype=float)
+            noise = np.full(y.shape, np.nan)
+            for row, r in enumerate(records):
+                if r.get("confidence", {}).get(metric):
+                    t = stats.t.ppf((1 + self.confidence) / 2, r["replications"] - 1)
+                    noise[row] = ((np.diff(r["confidence"][metric], axis=1)[:, 0] / 2) / t) ** 2
+            self.models[metric] = {"x": x, "size": np.abs(y).mean(axis=0),
+                                   "columns": [fit_column(x, y[:, j], noise[:, j]) for j in range(y.shape[1])]}
+
+    def predict(self, means: dict) -> tuple:
+        """
+        Predicts the metrics at a point from the metamodel
+        :param means: the means of the point
+        :return: the predicted mean and confidence interval half width of every metric
+        """
+        if self.models is None:
+            self.fit()
+        z = stats.norm.ppf((1 + self.confidence) / 2)
+        point = self.inputs(means)
+        mean, half_width = {}, {}
+        for metric, model in self.models.items():
+            distances = ((model["x"] - point) ** 2).sum(axis=1)
+            mean[metric], half_width[metric] = [], []
+            for column in model["columns"]:
+                k = np.exp(-distances / (2 * column["length"] ** 2))
+                v = linalg.solve_triangular(column["factor"][0], k, lower=True)
+                mean[metric].append(float(column["center"] + column["scale"] * k @ column["alpha"]))
+                half_width[metric].append(float(z * column["scale"] * np.sqrt(max(1 - v @ v, 0))))
+        return mean, half_width
+
+    def query(self, means: dict) -> dict:
+        """
+        Answers a what-if query, from the store if the point was simulated, from the metamodel if it is precise
+        enough, and by simulating the point otherwise
+        :param means: the means of the point, missing ones taken from the base point
+        :return: the mean and confidence interval half width of every metric, and where the answer came from
+        """
+        means = dict(self.base, **means)
+        key = "query@" + json.dumps(means, sort_keys=True)
+        if key not in self.records and len(self.records) >= self.min_points:
+            mean, half_width = self.predict(means)
+            if all(h <= self.tolerance * max(abs(m), s) for metric in (self.metrics or mean)
+                   for m, h, s in zip(mean[metric], half_width[metric], self.models[metric]["size"])):
+                return {"means": means, "mean": mean, "half_width": half_width, "source": "metamodel"}
+
+        source = "store" if key in self.records else "simulation"
+        if key not in self.records:
+            self.records.update(run_sweep([{"key": key, "means": means}], self.path, self.config,
+                                          self.replications, self.seed, workers=1))
+            self.models = None
+        record = self.records[key]
+        half_width = {metric: (np.diff(record["confidence"][metric], axis=1)[:, 0] / 2).tolist()
+                      for metric in record["confidence"]}
+        return {"means": means, "mean": record["mean"], "half_width": half_width, "source": source}
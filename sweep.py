@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from analysis import generate_confidence
+from inputs import MEANS
+from replication import make_config, resolve_deletion_point, run_replications
+from topology import load_topology
+
+UNSCORED = ("debug", "trace", "trace_format", "profile")  # settings that do not change the results of a point
+
+
+def expand_grid(means: dict = None, parameters: list = None, steps: int = 101, deviation: float = 0.5) -> list:
+    """
+    Expands the sensitivity grid, varying one mean at a time
+    :param means: the base means keyed like MEANS
+    :param parameters: the means to vary, all of them if None
+    :param steps: the number of points per mean
+    :param deviation: the largest relative change of a mean, 0.5 for +-50%
+    :return: the grid points
+    """
+    means = dict(means or MEANS)
+    changes = np.linspace(-deviation * 100, deviation * 100, steps)
+    points = []
+    for m in parameters or list(means):
+        for n in range(steps):
+            newMEANS = dict(means)
+            newMEANS[m] = means[m] * (1 + changes[n] / 100)
+            points.append({"key": "%s@%r" % (m, newMEANS[m]), "parameter": m, "step": n,
+                           "change": float(changes[n]), "means": newMEANS})
+    return points
+
+
+def point_seed(seed, key: str):
+    """
+    Derives the seed of a grid point so it does not depend on the order the grid is run in
+    :param seed: the seed of the sweep, None for fresh entropy
+    :param key: the key of the grid point
+    :return: the seed of the point
+    """
+    if seed is None:
+        return None
+    return int(np.random.SeedSequence([seed, zlib.crc32(key.encode())]).generate_state(1)[0])
+
+
+def fingerprint(config: dict, replications: int) -> str:
+    """
+    Identifies the settings a point is simulated with, so a stored point is only reused for the same settings
+    :param config: the facility config, with the means of the point
+    :param replications: the number of replications at the point
+    :return: a hash of the settings that change the results, including the contents of a topology file
+    """
+    settings = {key: value for key, value in make_config(config).items() if key not in UNSCORED}
+    if isinstance(settings["topology"], str):
+        settings["topology"] = load_topology(settings["topology"])
+    settings["replications"] = replications
+    return hashlib.sha256(json.dumps(settings, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def run_point(config: dict, point: dict, replications: int, seed) -> dict:
+    """
+    Simulates one grid point
+    :param config: the facility config
+    :param point: the grid point
+    :param replications: the number of replications at the point
+    :param seed: the seed of the point
+    :return: the record of the point
+    """
+    config = make_config(dict(config, means=point["means"]))
+    # time after deletion point over which data is measured
+    meas_time = config["max_minutes"] - config["deletion_point"]
+    results = run_replications(config, replications, seed, workers=1)
+    metrics = {"insp_blocked_rate": results["blocked_time"] / meas_time,
+               "ws_utilization": (meas_time - results["wait_time"]) / meas_time,
+               "ws_throughput": results["products_made"] / meas_time}
+
+    record = dict(point, replications=replications, fingerprint=fingerprint(config, replications), mean={},
+                  confidence={})
+    for name, values in metrics.items():
+        record["mean"][name] = values.mean(axis=0).tolist()
+        if replications > 1:
+            record["confidence"][name] = [list(map(float, generate_confidence(column))) for column in values.T]
+    return record
+
+
+def load_results(path: str, accept=None) -> dict:
+    """
+    Reads the finished points of a sweep, ignoring a line cut off by a crash
+    :param path: the results store
+    :param accept: a function telling if a record can be used, e.g. if it was simulated with the right settings,
+                   all records if None
+    :return: the records keyed by point
+    """
+    records = {}
+    if os.path.exists(path):
+        with open(path) as store:
+            for line in store:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if accept is None or accept(record):
+                    records[record["key"]] = record
+    return records
+
+
+def run_sweep(points: list, path: str, config: dict = None, replications: int = 1, seed=None,
+              workers: int = None) -> dict:
+    """
+    Runs the grid points on a worker pool, appending each finished point to the results store.
+    Points already in the store with the same settings are skipped, so an interrupted sweep can be restarted, and a
+    store shared by sweeps of other settings does not give their results.
+    :param points: the grid points from expand_grid
+    :param path: the results store
+    :param config: the facility config
+    :param replications: the number of replications at every point
+    :param seed: the seed of the sweep, None for fresh entropy
+    :param workers: the number of worker processes, 1 to run in this process
+    :return: the records of the points keyed by point
+    """
+    config = resolve_deletion_point(config, seed, workers)  # once for the base point, so every point shares it
+    expected = {p["key"]: fingerprint(dict(config, means=p["means"]), replications) for p in points}
+    records = load_results(path, lambda record: record.get("fingerprint") == expected.get(record["key"]))
+    pending = [p for p in points if p["key"] not in records]
+    workers = workers or os.cpu_count() or 1
+
+    partial = False
+    if os.path.exists(path) and os.path.getsize(path):
+        with open(path, "rb") as store:
+            store.seek(-1, os.SEEK_END)
+            partial = store.read(1) != b"\n"
+
+    with open(path, "a") as store:
+        if partial:
+            store.write("\n")  # end a line cut off by a crash so it is not joined to the next record
+
+        def save(record):
+            records[record["key"]] = record
+            store.write(json.dumps(record) + "\n")
+            store.flush()
+
+        if workers == 1:
+            for p in pending:
+                save(run_point(config, p, replications, point_seed(seed, p["key"])))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(run_point, config, p, replications, point_seed(seed, p["key"]))
+                           for p in pending]
+                for future in as_completed(futures):
+                    save(future.result())
+    return records
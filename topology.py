@@ -0,0 +1,218 @@
+import json
+import os
+
+from classes import Component, Product
+from inputs import MEANS, DATA_FILES
+from routing import ROUTERS
+
+REFERENCE = {
+    "components": ["Component 1", "Component 2", "Component 3"],
+    "products": [{"name": "Product 1", "required_components": ["Component 1"]},
+                 {"name": "Product 2", "required_components": ["Component 1", "Component 2"]},
+                 {"name": "Product 3", "required_components": ["Component 1", "Component 3"]}],
+    "streams": {key: {"mean": MEANS[key], "data": DATA_FILES[key]} for key in MEANS},
+    "workstations": [{"name": "Workstation 1", "product": "Product 1", "service": "ws1_time", "capacity": 2},
+                     {"name": "Workstation 2", "product": "Product 2", "service": "ws2_time", "capacity": 2},
+                     {"name": "Workstation 3", "product": "Product 3", "service": "ws3_time", "capacity": 2}],
+    "inspectors": [{"name": "Inspector 1", "components": {"Component 1": "insp1_time"},
+                    "workstations": ["Workstation 1", "Workstation 2", "Workstation 3"]},
+                   {"name": "Inspector 2", "components": {"Component 2": "insp22_time", "Component 3": "insp23_time"},
+                    "workstations": ["Workstation 2", "Workstation 3"]}],
+}
+
+
+class TopologyError(ValueError):
+    pass
+
+
+def load_topology(source) -> dict:
+    """
+    Reads a facility topology
+    :param source: a topology dict, or the path of a .json, .yaml or .yml file holding one
+    :return: the topology
+    """
+    if isinstance(source, dict):
+        return source
+    with open(source) as f:
+        if os.path.splitext(source)[1] in (".yaml", ".yml"):
+            import yaml  # only needed for YAML topologies
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def check_names(spec: dict, section: str) -> list:
+    """
+    Checks that the entries of a section have unique names
+    :param spec: the topology
+    :param section: the section of the topology
+    :return: the names
+    """
+    names = [entry if isinstance(entry, str) else entry["name"] for entry in spec.get(section, [])]
+    if not names:
+        raise TopologyError("the topology has no %s" % section)
+    duplicates = {name for name in names if names.count(name) > 1}
+    if duplicates:
+        raise TopologyError("duplicate %s: %s" % (section, ", ".join(sorted(duplicates))))
+    return names
+
+
+def validate(spec: dict):
+    """
+    Checks that a topology describes a facility that can run
+    :param spec: the topology
+    :return: None
+    """
+    components = set(check_names(spec, "components"))
+    check_names(spec, "products")
+    check_names(spec, "workstations")
+    check_names(spec, "inspectors")
+    products = {p["name"]: p for p in spec["products"]}
+    workstations = {w["name"]: w for w in spec["workstations"]}
+    streams = spec.get("streams", {})
+
+    for name, stream in streams.items():
+        if not stream.get("mean", 0) > 0:
+            raise TopologyError("stream %s needs a positive mean" % name)
+    for product in spec["products"]:
+        if not product["required_components"]:
+            raise TopologyError("%s requires no components" % product["name"])
+        for c in product["required_components"]:
+            if c not in components:
+                raise TopologyError("%s requires unknown component %s" % (product["name"], c))
+
+    for w in spec["workstations"]:
+        if w["product"] not in products:
+            raise TopologyError("%s builds unknown product %s" % (w["name"], w["product"]))
+        if w["service"] not in streams:
+            raise TopologyError("%s uses unknown stream %s" % (w["name"], w["service"]))
+        capacity = w.get("capacity", 2)
+        required = products[w["product"]]["required_components"]
+        capacities = capacity.values() if isinstance(capacity, dict) else [capacity]
+        if isinstance(capacity, dict) and set(capacity) != set(required):
+            raise TopologyError("%s needs a capacity for each of %s" % (w["name"], ", ".join(required)))
+        if not all(isinstance(c, int) and c > 0 for c in capacities):
+            raise TopologyError("%s needs positive integer buffer capacities" % w["name"])
+
+    fed = set()
+    for i in spec["inspectors"]:
+        if i.get("policy", "first") not in ROUTERS:
+            raise TopologyError("%s has unknown policy %s" % (i["name"], i["policy"]))
+        targets = i.get("workstations", list(workstations))
+        for name in targets:
+            if name not in workstations:
+                raise TopologyError("%s sends to unknown workstation %s" % (i["name"], name))
+        for c, stream in i["components"].items():
+            if c not in components:
+                raise TopologyError("%s inspects unknown component %s" % (i["name"], c))
+            if stream not in streams:
+                raise TopologyError("%s uses unknown stream %s" % (i["name"], stream))
+            accepting = [name for name in targets
+                         if c in products[workstations[name]["product"]]["required_components"]]
+            if not accepting:
+                raise TopologyError("%s has no workstation to send %s to" % (i["name"], c))
+            fed.update((name, c) for name in accepting)
+
+    for w in spec["workstations"]:
+        for c in products[w["product"]]["required_components"]:
+            if (w["name"], c) not in fed:
+                raise TopologyError("no inspector sends %s to %s" % (c, w["name"]))
+
+
+class CompiledModel:
+
+    def __init__(self, spec: dict):
+        """
+        Constructor for a compiled model, which checks a topology once and keeps the tables needed to build
+        a replication of it
+        :param spec: the topology
+        """
+        validate(spec)
+        self.spec = spec
+        self.components = {name: Component(name) for name in spec["components"]}
+        self.products = {p["name"]: Product(p["name"], [self.components[c] for c in p["required_components"]])
+                         for p in spec["products"]}
+        self.streams = list(spec["streams"])
+        self.data_files = {name: stream.get("data") for name, stream in spec["streams"].items()}
+
+        index = {w["name"]: position for position, w in enumerate(spec["workstations"])}
+        self.workstations = []
+        for w in spec["workstations"]:
+            product = self.products[w["product"]]
+            capacity = w.get("capacity", 2)
+            if isinstance(capacity, dict):
+                capacity = {self.components[c]: capacity[c] for c in capacity}
+            self.workstations.append((w["name"], product, w["service"], capacity))
+
+        self.inspectors = []
+        for i in spec["inspectors"]:
+            components = [self.components[c] for c in i["components"]]
+            streams = list(i["components"].values())
+            # routing table: the workstations that take any of the inspector's components, in tie-break order
+            routes = [index[name] for name in i.get("workstations", list(index))
+                      if any(c in self.workstations[index[name]][1].required_components for c in components)]
+            self.inspectors.append((i["name"], components, streams, routes, i.get("policy")))
+
+    def means(self, overrides: dict = None) -> dict:
+        """
+        Returns the mean of every stream
+        :param overrides: means replacing those of the topology, e.g. from a sensitivity sweep
+        :return: the means in stream order
+        """
+        overrides = overrides or {}
+        return {name: overrides.get(name, self.spec["streams"][name]["mean"]) for name in self.streams}
+
+    def layout(self) -> dict:
+        """
+        Describes the entities and buffers of the facility, e.g. for a trace of a run
+        :return: the names of the entities, workstations first, the names of the components, and the workstation,
+                 component and capacity of every buffer
+        """
+        buffers = []
+        for name, product, _, capacity in self.workstations:
+            for c in product.required_components:
+                buffers.append([name, c.name, capacity[c] if isinstance(capacity, dict) else capacity])
+        return {"entities": [w[0] for w in self.workstations] + [i[0] for i in self.inspectors],
+                "components": list(self.components), "buffers": buffers}
+
+    def instantiate(self, env, times: dict, debug: bool, deletion_point: int, alternate: bool, rngs: list,
+                    workstation, inspector, metrics_on: dict = None, policy: str = None, tracer=None) -> tuple:
+        """
+        Builds a replication of the facility
+        :param env: the environment the facility will be in
+        :param times: the processing times or samplers of each stream
+        :param debug: if debug mode should be on
+        :param deletion_point: the deletion point of the model
+        :param alternate: if inspectors without a policy of their own use the alternate design
+        :param rngs: the random.Random choosing the components of each inspector
+        :param workstation: the workstation class of the engine
+        :param inspector: the inspector class of the engine
+        :param metrics_on: the metrics kept with their options, metrics.DEFAULT_METRICS if None
+        :param policy: the routing policy of inspectors without a policy of their own, one of routing.ROUTERS,
+                       first or last depending on alternate if None
+        :param tracer: the tracing.Tracer recording the events of the run, None to not trace
+        :return: the inspectors and the workstations
+        """
+        workstations = [workstation(env, name, product, times[service], debug, deletion_point, metrics_on, capacity,
+                                    tracer) for name, product, service, capacity in self.workstations]
+        inspectors = []
+        for (name, components, streams, routes, own_policy), rng in zip(self.inspectors, rngs):
+            inspectors.append(inspector(env, name, components, [times[s] for s in streams],
+                                        [workstations[w] for w in routes], debug, deletion_point, alternate, rng,
+                                        metrics_on, own_policy or policy, tracer))
+        return inspectors, workstations
+
+
+compiled_models = {}
+
+
+def compile_topology(source=None) -> CompiledModel:
+    """
+    Compiles a topology, reusing the model if the same topology was compiled before in this process
+    :param source: a topology dict or file path, the reference facility if None
+    :return: the compiled model
+    """
+    key = source if isinstance(source, str) else json.dumps(source if source is not None else REFERENCE,
+                                                            sort_keys=True)
+    if key not in compiled_models:
+        compiled_models[key] = CompiledModel(load_topology(source if source is not None else REFERENCE))
+    return compiled_models[key]
@@ -0,0 +1,109 @@
+import glob
+import json
+import os
+
+import numpy as np
+
+KINDS = ("sent", "blocked", "took", "started", "finished")
+SENT, BLOCKED, TOOK, STARTED, FINISHED = range(len(KINDS))
+RECORD = np.dtype([("time", "f8"), ("entity", "i2"), ("kind", "u1"), ("component", "i2"), ("destination", "i2"),
+                   ("level", "i2"), ("wait", "f8")])
+FORMATS = ("npy", "parquet")
+
+
+class Tracer:
+
+    def __init__(self, path: str, meta: dict, capacity: int = 65536, fmt: str = "npy"):
+        """
+        Constructor for a tracer, which appends event records to a preallocated buffer and writes the buffer out
+        in bulk whenever it fills, so a run of any length is traced in bounded memory
+        :param path: the directory the trace is written to
+        :param meta: the names of the entities and components, the buffers and anything else describing the run
+        :param capacity: the number of records held before they are written out
+        :param fmt: one of FORMATS, parquet needing pyarrow
+        """
+        if fmt not in FORMATS:
+            raise ValueError("unknown trace format: %s" % fmt)
+        self.path = path
+        self.meta = dict(meta, kinds=KINDS, format=fmt)
+        self.entities = {name: index for index, name in enumerate(meta["entities"])}
+        self.components = {name: index for index, name in enumerate(meta["components"])}
+        self.buffer = np.zeros(capacity, dtype=RECORD)
+        self.size = 0
+        self.chunks = 0
+        self.writer = None
+        os.makedirs(path, exist_ok=True)
+        for stale in glob.glob(os.path.join(path, "chunk-*.npy")) + glob.glob(os.path.join(path, "trace.parquet")):
+            os.remove(stale)
+
+    def record(self, time: float, entity: int, kind: int, component: int = -1, destination: int = -1,
+               level: int = -1, wait: float = 0.0):
+        """
+        Appends an event record
+        :param time: the time of the event
+        :param entity: the index of the inspector or workstation
+        :param kind: the index of the event kind in KINDS
+        :param component: the index of the component, -1 for none
+        :param destination: the index of the workstation whose buffer changed, -1 for none
+        :param level: the level of that buffer, -1 for none
+        :param wait: the time the entity was blocked or starved before the event
+        :return: None
+        """
+        if self.size == len(self.buffer):
+            self.flush()
+        self.buffer[self.size] = (time, entity, kind, component, destination, level, wait)
+        self.size += 1
+
+    def flush(self):
+        """
+        Writes out the buffered records and empties the buffer
+        :return: None
+        """
+        if not self.size:
+            return
+        records = self.buffer[:self.size]
+        if self.meta["format"] == "npy":
+            np.save(os.path.join(self.path, "chunk-%06d.npy" % self.chunks), records)
+        else:
+            import pyarrow as pa  # only needed for Parquet traces
+            import pyarrow.parquet as pq
+            table = pa.Table.from_arrays([records[name] for name in RECORD.names], names=list(RECORD.names))
+            if self.writer is None:
+                self.writer = pq.ParquetWriter(os.path.join(self.path, "trace.parquet"), table.schema)
+            self.writer.write_table(table)
+        self.chunks += 1
+        self.size = 0
+
+    def close(self, end: float, levels: list = None):
+        """
+        Writes out the remaining records and the description of the run
+        :param end: the time the run ended
+        :param levels: the level of every buffer at the end, in the order of the buffers in the description, which
+                       lets the conservation of components be checked against the facility itself
+        :return: None
+        """
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump(dict(self.meta, end=end, chunks=self.chunks, levels=levels), f, indent=1)
+
+
+def load_trace(path: str) -> tuple:
+    """
+    Reads a trace written by a Tracer
+    :param path: the directory of the trace
+    :return: the records in the order they were made, and the description of the run
+    """
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    if meta["format"] == "parquet":
+        import pyarrow.parquet as pq  # only needed for Parquet traces
+        table = pq.read_table(os.path.join(path, "trace.parquet"))
+        records = np.zeros(table.num_rows, dtype=RECORD)
+        for name in RECORD.names:
+            records[name] = table.column(name).to_numpy()
+        return records, meta
+    chunks = [np.load(os.path.join(path, "chunk-%06d.npy" % n), mmap_mode="r") for n in range(meta["chunks"])]
+    return (np.concatenate(chunks) if chunks else np.zeros(0, dtype=RECORD)), meta
@@ -0,0 +1,110 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+
+from replication import make_config, replication_seeds, simulate
+
+PILOT_RUNS = 5
+PILOT_MINUTES = 1000
+
+
+def run_series(config: dict, seed: int) -> np.ndarray:
+    """
+    Runs a replication and keeps the products made by the facility in each minute
+    :param config: the facility config
+    :param seed: the seed of the replication
+    :return: the products made per minute
+    """
+    config = make_config(config)
+    metrics_on = dict(config["metrics"] or {}, products_time={"width": 1})
+    inspectors, workstations = simulate(dict(config, metrics=metrics_on), seed)
+    return np.sum([w.products_time.to_array(config["max_minutes"]) for w in workstations], axis=0)
+
+
+def collect_series(config: dict, runs: int, seed=None, workers: int = None) -> np.ndarray:
+    """
+    Collects the per minute output of several replications on a process pool
+    :param config: the facility config
+    :param runs: the number of replications
+    :param seed: the seed of the study, None for fresh entropy
+    :param workers: the number of worker processes, 1 to run in this process
+    :return: one row per replication, one column per minute
+    """
+    seeds = replication_seeds(seed, runs)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or runs == 1:
+        return np.array(list(map(run_series, repeat(config), seeds)))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return np.array(list(executor.map(run_series, repeat(config), seeds)))
+
+
+def welch(series: np.ndarray, window: int) -> np.ndarray:
+    """
+    Welch's moving average of the output averaged across replications
+    :param series: one row per replication, one column per minute
+    :param window: the half width of the moving average
+    :return: the smoothed output of minutes 0 to len - window - 1
+    """
+    averaged = np.atleast_2d(series).mean(axis=0)
+    cumulative = np.concatenate(([0.0], np.cumsum(averaged)))
+    smoothed = []
+    for i in range(len(averaged) - window):
+        w = min(i, window)  # the window shrinks at the start so it stays centered
+        smoothed.append((cumulative[i + w + 1] - cumulative[i - w]) / (2 * w + 1))
+    return np.array(smoothed)
+
+
+def welch_deletion_point(series: np.ndarray, window: int = 50, tolerance: float = 0.05) -> int:
+    """
+    Picks the first minute at which Welch's moving average reaches the steady state level, taken as the mean
+    of its second half. The moving average counts as having reached it once it is within the tolerance plus
+    two standard deviations of the second half, so the noise left after smoothing is not mistaken for warm-up.
+    :param series: one row per replication, one column per minute
+    :param window: the half width of the moving average
+    :param tolerance: how far the moving average may be from the steady state level, relative to it
+    :return: the deletion point in minutes
+    """
+    smoothed = welch(series, window)
+    steady = smoothed[len(smoothed) // 2:]
+    band = tolerance * steady.mean() + 2 * steady.std()
+    inside = np.nonzero(np.abs(smoothed - steady.mean()) <= band)[0]
+    return int(inside[0]) if inside.size else len(smoothed)
+
+
+def mser(series: np.ndarray, batch: int = 5) -> int:
+    """
+    Picks the deletion point minimising the MSER statistic of the output averaged across replications,
+    searched over the first half of the run
+    :param series: one row per replication, one column per minute
+    :param batch: the number of minutes averaged into each observation, 5 for MSER-5
+    :return: the deletion point in minutes
+    """
+    averaged = np.atleast_2d(series).mean(axis=0)
+    n = len(averaged) // batch
+    batches = averaged[:n * batch].reshape(n, batch).mean(axis=1)
+
+    best, best_d = np.inf, 0
+    for d in range(n // 2):
+        rest = batches[d:]
+        statistic = ((rest - rest.mean()) ** 2).sum() / len(rest) ** 2
+        if statistic < best:
+            best, best_d = statistic, d
+    return best_d * batch
+
+
+def detect_deletion_point(config: dict = None, runs: int = PILOT_RUNS, max_minutes: int = PILOT_MINUTES,
+                          seed=None, workers: int = None) -> int:
+    """
+    Runs a few short pilot replications and picks the later of the Welch and MSER-5 deletion points
+    :param config: the facility config
+    :param runs: the number of pilot replications
+    :param max_minutes: the length of each pilot replication
+    :param seed: the seed of the pilot, None for fresh entropy
+    :param workers: the number of worker processes, 1 to run in this process
+    :return: the deletion point in minutes
+    """
+    config = make_config(dict(config or {}, max_minutes=max_minutes, deletion_point=0))
+    series = collect_series(config, runs, seed, workers)
+    return max(welch_deletion_point(series), mser(series))